@@ -38,6 +38,17 @@ layer_map = {
 lib = gdstk.Library()
 top = lib.new_cell("TOP")
 
+
+def add_children(cells):
+    """Adds cells to the library, skipping names already in it (e.g. glyph
+    cells shared between arrays)."""
+    names = {cell.name for cell in lib.cells}
+    for cell in cells:
+        if cell.name not in names:
+            lib.add(cell)
+            names.add(cell.name)
+
+
 # count device IDs
 id_count = 0
 
@@ -64,10 +75,7 @@ array_TestStr, children_TestStr = make_rc_array(
 id_count += len(array_TestStr.references)
 
 # Add child cells to the library
-names = [cell.name for cell in lib.cells]
-for cell in children_TestStr:
-    if cell.name not in names:
-        lib.add(cell)
+add_children(children_TestStr)
 
 # Add array to top-level layout        
 top.add(gdstk.Reference(array_TestStr, (2600, 3125)))
@@ -100,7 +108,8 @@ array_fefet_4, children_4 = make_multiparam_array(
 
 id_count += len(array_fefet_4.references)
 
-lib.add(*children_4)
+# Add child cells to the library, glyph cells are shared between arrays
+add_children(children_4)
 top.add(gdstk.Reference(array_fefet_4, (-2600, 1250)))
 
 
@@ -122,7 +131,8 @@ array_fefet_6, children_6 = make_multiparam_array(
 
 id_count += len(array_fefet_6.references)
 
-lib.add(*children_6)
+# Add child cells to the library, glyph cells are shared between arrays
+add_children(children_6)
 top.add(gdstk.Reference(array_fefet_6, (2700, 1250)))
 
 #--------------HallBar Arrays--------------
@@ -151,7 +161,8 @@ array_hallbar_4, children_hb4 = make_multiparam_array(
 
 id_count += len(array_hallbar_4.references)
 
-lib.add(*children_hb4)
+# Add child cells to the library, glyph cells are shared between arrays
+add_children(children_hb4)
 top.add(gdstk.Reference(array_hallbar_4, (-2600, -1325)))
 
 # -------------- HallBar_design6 --------------
@@ -172,7 +183,8 @@ array_hallbar_6, children_hb6 = make_multiparam_array(
 
 id_count += len(array_hallbar_6.references)
 
-lib.add(*children_hb6)
+# Add child cells to the library, glyph cells are shared between arrays
+add_children(children_hb6)
 top.add(gdstk.Reference(array_hallbar_6, (2600, -1325)))
 
 
@@ -205,10 +217,7 @@ array_FeCAP_small.name = "Array_FeCAP6_small1"
 id_count += len(array_FeCAP_small.references)
 
 # Add child cells to the library
-names = [cell.name for cell in lib.cells]
-for cell in children_FeCAP_small:
-    if cell.name not in names:
-        lib.add(cell)
+add_children(children_FeCAP_small)
 
       
 
@@ -229,10 +238,7 @@ array_FeCAP_small2.name = "Array_FeCAP6_small2"
 id_count += len(array_FeCAP_small2.references)
 
 # Add child cells to the library
-names = [cell.name for cell in lib.cells]
-for cell in children_FeCAP_small2:
-    if cell.name not in names:
-        lib.add(cell)
+add_children(children_FeCAP_small2)
 
 print(type(array_FeCAP_small2))  
 # Add array to top-level layout        
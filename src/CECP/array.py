@@ -1,21 +1,190 @@
 # helper functions to make arrays of things, particularly by sweeping some parameters
 # should also give exclusion functionality
 
+import concurrent.futures
+import functools
 import gdstk
+import hashlib
+import inspect
 import itertools
 import numpy as np
+import os
+import pickle
+import sys
+from typing import Iterator, NamedTuple
 
 from .base import Feature, FabString
 from .shapes import rectangle
 from .merge import get_children
-from .components import make_label
+from .components import make_label, label_engine
+from .cache import build_cache, feature_key, freeze
+from .parallel import build_all, pack, unpack, pack_hierarchy, unpack_hierarchy
+from .utils.helpers import box_polygons, mask_rectangles, rectangle_corners
 
 
 
+class ExclusionIndex:
+    """Grid-binned spatial index over the bounding boxes of exclusion polygons.
+    
+    Candidate slots are first rejected by bounding box, only the few 
+    exclusions whose bins and bounding boxes touch the slot are passed on to 
+    the exact (and comparatively slow) boolean operation.
+    
+    Can be passed to the array builders in place of a list of polygons.
+    
+    Exclusions can also be given as an (N, 2, 2) array of boxes, e.g. from 
+    Clearance.get_clearance_bbox_array. Slots are then checked against the 
+    boxes directly and rectangles are only created if polygons is accessed.
+    """
+    def __init__(self, exclusions: list[gdstk.Polygon] | np.ndarray=[], bin_size: float | None=None) -> None:
+        """
+        Parameters
+        ----------
+        exclusions : list of gdstk.Polygon or numpy.ndarray, optional
+            Areas where a device should not be placed, as polygons or (N, 2, 2)
+            array of ((xmin, ymin), (xmax, ymax)). Defaults to an empty list.
+        bin_size : float or None, optional
+            Edge length of the square bins. If None, it is derived from the 
+            average extent of the exclusions. Defaults to None.
+        """
+        self.boxes_only = isinstance(exclusions, np.ndarray)
+        if self.boxes_only:
+            self._polygons = None
+            self.bboxes = exclusions.astype(float).reshape(-1, 2, 2)
+        else:
+            self._polygons = list(exclusions)
+            self.bboxes = np.array([polygon.bounding_box() for polygon in self._polygons], dtype=float).reshape(-1, 2, 2)
+        self.bins = {}
+        if len(self.bboxes) == 0:
+            self.bin_size = 1.0 if bin_size is None else bin_size
+            return
+        if bin_size is None:
+            extents = self.bboxes[:, 1] - self.bboxes[:, 0]
+            total = self.bboxes[:, 1].max(axis=0) - self.bboxes[:, 0].min(axis=0)
+            # roughly one bin per exclusion, but never more than 256 per axis
+            bin_size = max(extents.max(axis=1).mean(), total.max() / 256)
+        self.bin_size = bin_size if bin_size > 0 else 1.0
+        for idx, ((i0, j0), (i1, j1)) in enumerate(self._bin_range(self.bboxes)):
+            for i in range(i0, i1 + 1):
+                for j in range(j0, j1 + 1):
+                    self.bins.setdefault((i, j), []).append(idx)
+
+    @property
+    def polygons(self) -> list[gdstk.Polygon]:
+        """The exclusions as polygons, created on first access for boxes."""
+        if self._polygons is None:
+            self._polygons = box_polygons(self.bboxes)
+        return self._polygons
+
+    def _bin_range(self, bboxes: np.ndarray) -> np.ndarray:
+        """Returns the lower and upper bin indices spanned by (N, 2, 2) 
+        bounding boxes."""
+        return np.floor(bboxes / self.bin_size).astype(int)
+
+    def candidates(self, bbox: tuple[tuple[float, float], tuple[float, float]]) -> list[int]:
+        """Indices of the exclusions whose bounding box touches the one 
+        supplied.
+        
+        Parameters
+        ----------
+        bbox : ((float, float), (float, float))
+            Lower left and upper right corner of the area to check.
+        
+        Returns
+        -------
+        list of int
+            Indices into ExclusionIndex.polygons.
+        """
+        (x0, y0), (x1, y1) = bbox
+        (i0, j0), (i1, j1) = self._bin_range(np.array([bbox], dtype=float))[0]
+        found = set()
+        for i in range(i0, i1 + 1):
+            for j in range(j0, j1 + 1):
+                found.update(self.bins.get((i, j), ()))
+        return [
+            idx for idx in sorted(found)
+            if self.bboxes[idx, 0, 0] <= x1 and self.bboxes[idx, 1, 0] >= x0
+            and self.bboxes[idx, 0, 1] <= y1 and self.bboxes[idx, 1, 1] >= y0
+        ]
+
+    def overlaps(self, polygon: gdstk.Polygon) -> bool:
+        """Checks if the polygon overlaps with any of the exclusions.
+        
+        Parameters
+        ----------
+        polygon : gdstk.Polygon
+            Polygon to check for collision.
+        
+        Returns
+        -------
+        bool
+        """
+        candidates = self.candidates(polygon.bounding_box())
+        if len(candidates) == 0:
+            return False
+        if self.boxes_only and rectangle_corners(polygon) is not None:
+            # rectangles overlap boxes exactly if their interiors intersect
+            (x0, y0), (x1, y1) = polygon.bounding_box()
+            return any(
+                self.bboxes[idx, 0, 0] < x1 and self.bboxes[idx, 1, 0] > x0
+                and self.bboxes[idx, 0, 1] < y1 and self.bboxes[idx, 1, 1] > y0
+                for idx in candidates
+            )
+        return len(gdstk.boolean(polygon, [self.polygons[idx] for idx in candidates], "and")) > 0
+
+    def mask(self, origins: np.ndarray, size: tuple[float, float]) -> np.ndarray:
+        """Checks many equally sized slots at once.
+        
+        The bounding box test is vectorised over all slots, the exact boolean 
+        is only run for slots touching the bounding box of an exclusion.
+        
+        Parameters
+        ----------
+        origins : numpy.ndarray
+            (N, 2) array of slot centres.
+        size : (float, float)
+            Size of each slot.
+        
+        Returns
+        -------
+        numpy.ndarray
+            (N,) boolean mask, True where a slot is free of exclusions.
+        """
+        origins = np.asarray(origins, dtype=float).reshape(-1, 2)
+        keep = np.ones(len(origins), dtype=bool)
+        if len(self.bboxes) == 0 or len(origins) == 0:
+            return keep
+        lower = origins - np.asarray(size, dtype=float) / 2
+        upper = origins + np.asarray(size, dtype=float) / 2
+        if self.boxes_only:
+            # slots are rectangles, so comparing with the boxes is exact
+            for (x0, y0), (x1, y1) in self.bboxes:
+                keep &= ~(
+                    (lower[:, 0] < x1) & (upper[:, 0] > x0)
+                    & (lower[:, 1] < y1) & (upper[:, 1] > y0)
+                )
+            return keep
+        touching = np.zeros(len(origins), dtype=bool)
+        for (x0, y0), (x1, y1) in self.bboxes:
+            touching |= (
+                (lower[:, 0] <= x1) & (upper[:, 0] >= x0)
+                & (lower[:, 1] <= y1) & (upper[:, 1] >= y0)
+            )
+        for idx in np.flatnonzero(touching):
+            keep[idx] = not self.overlaps(gdstk.rectangle(lower[idx], upper[idx]))
+        return keep
+
+    def __len__(self) -> int:
+        return len(self.bboxes)
+
+    def __iter__(self):
+        return iter(self.polygons)
+
+
 def has_overlap(
         generating_class: Feature, 
         origin: tuple[float, float],
-        exclusions: list[gdstk.Polygon],
+        exclusions: list[gdstk.Polygon] | np.ndarray | ExclusionIndex,
         ) -> bool:
     """Checks if the device a generated by the supplied Feature subclass overlaps with a specified exclusion.
     
@@ -25,18 +194,197 @@ def has_overlap(
         Cell to check if overlaps with an excluded polygon.
     origin : (float, float)
         Reference origin at which to place device.
-    exclusions : list of gdstk.Polygon
-        Polygons to check for collision with.
+    exclusions : list of gdstk.Polygon, numpy.ndarray or ExclusionIndex
+        Polygons, or (N, 2, 2) array of boxes, to check for collision with. 
+        Pass an ExclusionIndex when checking many positions against the same 
+        exclusions.
     
     Returns
     -------
     bool
     """
-    if len(gdstk.boolean(rectangle(generating_class.size[0], generating_class.size[1], origin=origin), exclusions, "and")) > 0:
+    if len(exclusions) == 0:
+        return False
+    slot = rectangle(generating_class.size[0], generating_class.size[1], origin=origin)
+    if isinstance(exclusions, np.ndarray):
+        exclusions = ExclusionIndex(exclusions)
+    if isinstance(exclusions, ExclusionIndex):
+        return exclusions.overlaps(slot)
+    if len(gdstk.boolean(slot, exclusions, "and")) > 0:
         return True
     return False
 
 
+def grid_origins(
+        size: tuple[float, float],
+        n_sets: int,
+        axis: int=0,
+        repeat_perp: int=1,
+        repeat_para: int=1,
+        meta_rc: int=1,
+        ) -> np.ndarray:
+    """Computes the centred origins of all slots of an array at once.
+    
+    Slots are ordered by parameter set, each set occupying 
+    repeat_perp*repeat_para consecutive rows. Within a set, positions along 
+    the axis vary slowest.
+    
+    Parameters
+    ----------
+    size : (float, float)
+        Size of a single slot.
+    n_sets : int
+        Number of parameter sets to place.
+    axis : int, optional
+        Along which axis to sweep the parameter sets. Defaults to 0, which is 
+        the rows.
+    repeat_perp : int, optional
+        How many times to repeat a device perpendicular to the axis. Defaults 
+        to 1.
+    repeat_para : int, optional
+        How many times to repeat a device parallel to the axis. Defaults to 1.
+    meta_rc : int, optional
+        How many rows/columns the parameter sets should be split across. 
+        Defaults to 1.
+    
+    Returns
+    -------
+    numpy.ndarray
+        (n_sets*repeat_perp*repeat_para, 2) array of origins, centred around 
+        (0, 0).
+    """
+    if axis not in (0, 1):
+        raise ValueError("'axis' is not 0 or 1.")
+    n_para = n_sets*repeat_para
+    if n_para == 0 or repeat_perp == 0:
+        return np.zeros((0, 2))
+    per_line = n_para // meta_rc
+    if per_line == 0:
+        raise ValueError("'meta_rc' is larger than the number of devices along the axis.")
+    i, r = np.divmod(np.arange(n_para*repeat_perp), repeat_perp)
+    along = i % per_line
+    across = repeat_perp*(i // per_line) + r
+    if axis == 0:
+        steps = np.stack([along, across], axis=1)
+    else:
+        steps = np.stack([across, along], axis=1)
+    origins = steps * np.asarray(size, dtype=float)
+    # centre array around 0
+    return origins - origins[-1] / 2
+
+
+def repeated_references(
+        device: gdstk.Cell,
+        origins: np.ndarray,
+        pitch: tuple[float, float],
+        ) -> list[gdstk.Reference]:
+    """References a device at many positions of a regular grid using as few 
+    references as possible.
+    
+    The positions are split into rectangular blocks, each of which becomes 
+    one reference with a rectangular gdstk.Repetition (an AREF in GDS). 
+    Missing positions, e.g. from exclusions, split the grid into more blocks.
+    
+    Parameters
+    ----------
+    device : gdstk.Cell
+        The cell to reference.
+    origins : numpy.ndarray
+        (N, 2) array of positions, all lying on a grid with the given pitch.
+    pitch : (float, float)
+        Grid spacing in x and y.
+    
+    Returns
+    -------
+    list of gdstk.Reference
+    """
+    origins = np.asarray(origins, dtype=float).reshape(-1, 2)
+    if len(origins) == 0:
+        return []
+    pitch = np.asarray(pitch, dtype=float)
+    corner = origins.min(axis=0)
+    cols, rows = np.rint((origins - corner) / pitch).astype(int).T
+    mask = np.zeros((rows.max() + 1, cols.max() + 1), dtype=bool)
+    mask[rows, cols] = True
+    references = []
+    for row, col, n_rows, n_cols in mask_rectangles(mask):
+        origin = corner + (col, row) * pitch
+        if n_rows == n_cols == 1:
+            references.append(gdstk.Reference(device, origin))
+        else:
+            references.append(gdstk.Reference(device, origin, columns=n_cols, rows=n_rows, spacing=pitch))
+    return references
+
+
+def make_device_label(
+        generator: Feature,
+        count: int=0,
+        label: dict = {
+            "schema": "D-{x:03d}",
+            "size": 40,
+            "vertical": False,
+            "rotation": 0,
+        },
+        label_position: tuple[float, float]=(0, 0),
+        origin: tuple[float, float]=(0, 0),
+    ) -> list[gdstk.Reference | gdstk.Polygon]:
+    """Create the label of a device, formatted with the labels layer of the 
+    generator.
+    
+    Parameters
+    ----------
+    generator : Feature
+        The feature from which the device stems, used to get the layer_map and 
+        bounds for the label.
+    count : int, optional
+        Which number to place in the label. Defaults to 0.
+    label : dict, optional
+        Parameters to apply to the label, see place_device.
+    label_position : (float, float), optional
+        Where to place the label relative to the device. Defaults to (0, 0).
+    origin : (float, float), optional
+        Position of the device, by which the label is shifted after 
+        formatting. Defaults to (0, 0).
+    
+    Returns
+    -------
+    list of gdstk.Reference or gdstk.Polygon
+        Glyph references, or polygons if the label can not be built from 
+        glyphs.
+    """
+    text = label["schema"].format(x=count)
+    label_elements = None
+    if label.get("glyphs", True):
+        label_elements = label_engine.label(
+            text,
+            generator.layer_map["labels"],
+            generator.bounds,
+            size=label["size"],
+            origin=label_position,
+            rotation=label["rotation"],
+            vertical=label["vertical"],
+        )
+    if label_elements is None:
+        label_polygons = make_label(
+            text, 
+            size=label["size"], 
+            origin=label_position,
+            rotation=label["rotation"],
+            vertical=label["vertical"], 
+        )
+        label_elements = generator.layer_map["labels"].apply(
+            label_polygons, 
+            generator.bounds
+            )
+    if origin[0] != 0 or origin[1] != 0:
+        for element in label_elements:
+            if isinstance(element, gdstk.Reference):
+                element.origin = (element.origin[0] + origin[0], element.origin[1] + origin[1])
+            else:
+                element.translate(origin)
+    return label_elements
+
+
 def place_device(
         generator: Feature,
         device: gdstk.Cell,
@@ -65,7 +413,9 @@ def place_device(
     count : int, optional
         Which number to place in the label. Defaults to 0.
     label : dict, optional
-        Parameters to apply to the label.
+        Parameters to apply to the label. Unless "glyphs" is set to False, the 
+        label is built from references to shared glyph cells where the label 
+        format allows it.
     label_position : (float, float), optional
         Where to place the label for the cell. This should normally be defined 
         in the components dict from the build call. Defaults to (0, 0.).
@@ -78,22 +428,288 @@ def place_device(
         return gdstk.Reference(device, origin)
     labelled_cell = gdstk.Cell(FabString(label["schema"].replace("-", "_").format(x=count)))
     labelled_cell.add(gdstk.Reference(device, (0, 0)))
-    label_polygons = make_label(
-        label["schema"].format(x=count), 
-        size=label["size"], 
-        origin=label_position,
-        rotation=label["rotation"],
-        vertical=label["vertical"], 
-    )
-    labelled_cell.add(
-        *generator.layer_map["labels"].apply(
-            label_polygons, 
-            generator.bounds
-            )
-        )
+    labelled_cell.add(*make_device_label(generator, count, label, label_position))
     return gdstk.Reference(labelled_cell, origin)
 
 
+class ArrayState:
+    """Remembers which parameter sets produced which device cells of an 
+    array.
+    
+    Passing the same state when rebuilding an array only builds the devices 
+    of new or changed parameter sets, all others are reused. An entry is also 
+    rebuilt if the feature (layer_map, bounds, ...) or the source code 
+    changed, i.e. the modules defining the feature class and its bases or any 
+    module of this package. Entries not used by the latest build are dropped, so a 
+    state should only be used for one array.
+    
+    If a path is given, the state is stored there after every build and 
+    loaded on creation, so re-running a layout script only rebuilds what 
+    changed. The file is a pickle, only load files you created yourself.
+    
+    Example
+    -------
+    >>> state = ArrayState("fefet_4.state")
+    >>> array, children = make_multiparam_array(fefet_4, [channel_x, channel_y], state=state)
+    >>> state.built, state.reused
+    (1, 6)
+    """
+    version = 1
+
+    def __init__(self, path: str | None=None) -> None:
+        """
+        Parameters
+        ----------
+        path : str or None, optional
+            File to persist the state in. Defaults to None, keeping it in 
+            memory only.
+        """
+        self.path = path
+        # key -> [packed cells and components or None, built device or None]
+        self.entries = {}
+        self.built = 0
+        self.reused = 0
+        if path is not None and os.path.exists(path):
+            with open(path, "rb") as f:
+                stored = pickle.load(f)
+            if stored.get("version") == self.version:
+                self.entries = {key: [packed, None] for key, packed in stored["entries"].items()}
+
+    @staticmethod
+    def key(feature: Feature, parameter_set: tuple) -> str | None:
+        """Digest identifying a build, None if the arguments can not be 
+        keyed."""
+        try:
+            frozen = freeze((feature_key(feature), tuple(parameter_set)))
+        except TypeError:
+            return None
+        return hashlib.sha1(repr((frozen, _source_digest(type(feature)))).encode()).hexdigest()
+
+    def build_all(
+            self,
+            feature: Feature,
+            parameter_sets: list[tuple],
+            executor: concurrent.futures.Executor | None=None,
+            ) -> list[tuple[gdstk.Cell, dict]]:
+        """Returns the device for every parameter set, only building those 
+        not already known. See parallel.build_all for the arguments.
+        """
+        parameter_sets = [tuple(parameter_set) for parameter_set in parameter_sets]
+        keys = [self.key(feature, parameter_set) for parameter_set in parameter_sets]
+        missing = []
+        seen = set()
+        for i, key in enumerate(keys):
+            if key is None or (key not in self.entries and key not in seen):
+                missing.append(i)
+            seen.add(key)
+        new = dict(zip(missing, build_all(feature, [parameter_sets[i] for i in missing], executor)))
+        cells = {feature.main_cell.name: feature.main_cell}
+        results = []
+        for i, key in enumerate(keys):
+            if i in new:
+                if key is not None:
+                    self.entries[key] = [None, new[i]]
+                results.append(new[i])
+                continue
+            entry = self.entries[key]
+            if entry[1] is None:
+                packed_cells, components = entry[0]
+                entry[1] = (unpack_hierarchy(packed_cells, cells), unpack(components))
+            device, components = entry[1]
+            results.append((device, components.copy()))
+        seen.discard(None)
+        self.entries = {key: entry for key, entry in self.entries.items() if key in seen}
+        self.built = len(new)
+        self.reused = len(seen) - len([i for i in new if keys[i] is not None])
+        if self.path is not None:
+            self.save(feature)
+        return results
+
+    def save(self, feature: Feature) -> None:
+        """Stores the state at self.path.
+        
+        Parameters
+        ----------
+        feature : Feature
+            The feature the devices were built with, its main cell is not 
+            stored.
+        """
+        for entry in self.entries.values():
+            if entry[0] is None:
+                device, components = entry[1]
+                entry[0] = (pack_hierarchy(device, {feature.main_cell.name}), pack(components))
+        with open(self.path, "wb") as f:
+            pickle.dump({
+                "version": self.version,
+                "entries": {key: entry[0] for key, entry in self.entries.items()},
+            }, f)
+
+
+@functools.lru_cache
+def _source_digest(cls: type) -> str:
+    """Digest of the source code the geometry of a feature class may depend 
+    on: the modules of the class and its bases, and all modules of this 
+    package. Computed once per process, matching the code actually loaded.
+    """
+    sources = {}
+    for base in cls.__mro__:
+        module = sys.modules.get(base.__module__)
+        try:
+            sources[inspect.getsourcefile(module)] = inspect.getsource(module)
+        except (OSError, TypeError):
+            pass
+    package = os.path.dirname(sys.modules[__name__.split(".")[0]].__file__)
+    for directory, _, files in os.walk(package):
+        for file in files:
+            if file.endswith(".py"):
+                path = os.path.join(directory, file)
+                with open(path, encoding="utf-8") as f:
+                    sources[path] = f.read()
+    digest = hashlib.sha1()
+    for path in sorted(sources):
+        digest.update(os.path.relpath(path, package).encode())
+        digest.update(sources[path].encode())
+    return digest.hexdigest()
+
+
+class Placement(NamedTuple):
+    """A single device placed by iter_placements."""
+    device: gdstk.Cell
+    origin: tuple[float, float]
+    device_id: int
+    params: tuple
+    components: dict
+
+
+def iter_placements(
+        generating_class: Feature,
+        parameters: list[list],
+        count_0: int=1,
+        axis: int=0,
+        repeat_perp: int=1,
+        repeat_para: int=1,
+        meta_rc: int=1,
+        exclusions: list[gdstk.Polygon] | np.ndarray | ExclusionIndex=[],
+        exclusion_type: str="skip",
+        executor: concurrent.futures.Executor | None=None,
+        state: ArrayState | None=None,
+        ) -> Iterator[Placement]:
+    """Lazily yields the placements of an array with multiple parameters 
+    swept across rows and columns.
+    
+    Nothing but the slot origins is held in memory, devices are built (or 
+    taken from the build cache, if enabled) when their first placement is 
+    reached. This allows streaming placements straight into a writer or 
+    manifest, e.g. when tiling a layout across a wafer. The arguments follow 
+    make_multiparam_array.
+    
+    Parameters
+    ----------
+    generating_class : NDL.base.Feature
+        The feature used to generate the devices.
+    parameters : list of lists
+        The parameters to supply to the generating functions. All 
+        combinations are placed.
+    count_0 : int, optional
+        Initial value to number devices from. Defaults to 1.
+    axis : int, optional
+        Along which axis generate the devices. Defaults to 0, which is the 
+        rows.
+    repeat_perp : int, optional
+        How many times to repeat a device perpendicular to the axis. Defaults 
+        to 1.
+    repeat_para : int, optional
+        How many times to repeat a device parallel to the axis. Defaults to 1.
+    meta_rc : int=1, optional
+        How many rows/columns the data should be split across. Defaults to 1.
+    exclusions : list of gdstk.Polygon, numpy.ndarray or ExclusionIndex, optional
+        Areas where a device should not be placed, an array is read as 
+        (N, 2, 2) boxes. Defaults to an empty list.
+    exclusion_type : str, optional
+        Whether a device inside an exclusion should be skipped or place in the 
+        next position. Defaults to "skip".
+    executor : concurrent.futures.Executor or None, optional
+        If given, all devices are built up front using this executor. 
+        Defaults to None.
+    state : ArrayState or None, optional
+        If given, all devices are taken from or added to the state up front. 
+        Defaults to None.
+    
+    Yields
+    ------
+    Placement
+        The device cell, its origin, number, parameter set and components.
+    
+    Example
+    -------
+    >>> for placement in iter_placements(fefet, [[6.0], [7.0, 8.0]], repeat_perp=26):
+    ...     top.add(gdstk.Reference(placement.device, placement.origin))
+    """
+    if not isinstance(exclusions, ExclusionIndex):
+        exclusions = ExclusionIndex(exclusions)
+    combinations = list(itertools.product(*parameters))
+    origins = grid_origins(generating_class.size, len(combinations), axis, repeat_perp, repeat_para, meta_rc)
+    keep = exclusions.mask(origins, generating_class.size)
+    per_set = repeat_perp*repeat_para
+    if exclusion_type == "skip":
+        slots = (origins[i*per_set:(i+1)*per_set][keep[i*per_set:(i+1)*per_set]] for i in range(len(combinations)))
+    else:
+        # fill the free slots in order, devices that do not fit are dropped
+        free = origins[keep]
+        slots = (free[i*per_set:(i+1)*per_set] for i in range(len(combinations)))
+    if state is not None:
+        built = state.build_all(generating_class, combinations, executor)
+    elif executor is not None:
+        built = build_all(generating_class, combinations, executor)
+    else:
+        built = (build_cache.build(generating_class, *parameter_set) for parameter_set in combinations)
+    count = count_0
+    for parameter_set, (device, components), set_origins in zip(combinations, built, slots):
+        for origin in set_origins:
+            yield Placement(device, (float(origin[0]), float(origin[1])), count, parameter_set, components)
+            count += 1
+
+
+def _place_all(
+        array: gdstk.Cell,
+        generating_class: Feature,
+        placements: Iterator[Placement],
+        label_schema: str,
+        label_fmt: dict,
+        label_mode: str="device",
+        ) -> None:
+    """Adds placements to the array cell, labelled or as AREFs."""
+    if not label_schema:
+        for _, group in itertools.groupby(placements, key=lambda placement: id(placement.device)):
+            group = list(group)
+            array.add(*repeated_references(group[0].device, [p.origin for p in group], generating_class.size))
+        return
+    label = label_fmt | {"schema": label_schema}
+    if label_mode == "device":
+        for placement in placements:
+            array.add(place_device(generating_class, placement.device, placement.origin, placement.device_id,
+                label, placement.components["label_pos"]))
+        return
+    if label_mode == "array":
+        label_cell = array
+    elif label_mode == "cell":
+        # named after the array and its first device ID once known, as 
+        # several arrays of the same feature share the array cell's name
+        label_cell = gdstk.Cell(FabString(f"{array.name}_Labels"))
+        array.add(gdstk.Reference(label_cell, (0, 0)))
+    else:
+        raise ValueError("'label_mode' is not 'device', 'array' or 'cell'.")
+    first_id = None
+    for placement in placements:
+        if first_id is None:
+            first_id = placement.device_id
+        array.add(gdstk.Reference(placement.device, placement.origin))
+        label_cell.add(*make_device_label(generating_class, placement.device_id, label,
+            placement.components["label_pos"], placement.origin))
+    if label_mode == "cell" and first_id is not None:
+        label_cell.name = FabString(f"{array.name}_Labels_{first_id}")
+
+
 def make_rc_array(
         generating_class: Feature,
         parameters: list,
@@ -107,7 +723,10 @@ def make_rc_array(
         axis: int=0,
         repeat_perp: int=1,
         repeat_para: int=1,
-        exclusions: list[gdstk.Polygon]=[],
+        exclusions: list[gdstk.Polygon] | np.ndarray | ExclusionIndex=[],
+        executor: concurrent.futures.Executor | None=None,
+        state: ArrayState | None=None,
+        label_mode: str="device",
         ) -> tuple[gdstk.Cell, list[gdstk.Cell]]:
     """Make an array with parameters swept across rows and columns.
     
@@ -123,7 +742,8 @@ def make_rc_array(
     label_schema: str, optional
         The text format the labels should take. Should be a valid str.format 
         template. Defaults to "D-{x:03d}" which evaluates to e.g. "D-056". If
-        is empty string, no label is added.
+        is empty string, no label is added and repeated devices are placed 
+        as arrays of references (AREFs).
     label_fmt : dict, optional
         Format parameters for the label, such as rotation and size.
     count_0 : int, optional
@@ -137,9 +757,24 @@ def make_rc_array(
     repeat_para : int, optional
         How many times to repeat a device parallel to the axis. This 
         repetition extends perpendicular to axis. Defaults to 1.
-    exclusions : list of gdstk.Polygon
-        Areas where a device should not be placed. No device is placed if it 
-        would touch any of these areas. Defaults to an empty list.
+    exclusions : list of gdstk.Polygon, numpy.ndarray or ExclusionIndex
+        Areas where a device should not be placed, an array is read as 
+        (N, 2, 2) boxes. No device is placed if it would touch any of these 
+        areas. Defaults to an empty list.
+    executor : concurrent.futures.Executor or None, optional
+        Executor used to build the devices of the unique parameter sets, e.g. 
+        a ProcessPoolExecutor. If None, devices are built serially. Defaults 
+        to None.
+    state : ArrayState or None, optional
+        Record of the devices built for this array previously. Only devices 
+        of new or changed parameter sets are built. Defaults to None.
+    label_mode : str, optional
+        Where labels are placed. "device" wraps every device and its label in 
+        its own cell. "array" references the devices directly from the array 
+        cell and adds the labels to it, "cell" does the same but collects all 
+        labels in a single label cell referenced by the array. The latter two 
+        avoid creating a cell per device, but then the array's references no 
+        longer correspond to its devices. Defaults to "device".
     
     Returns
     -------
@@ -149,35 +784,9 @@ def make_rc_array(
         All cells under the array cell, including the array cell itself.
     """
     array = gdstk.Cell(FabString(f"Array_{generating_class.name}"))
-    count = count_0
-    if axis == 0:
-        size = (
-            repeat_para*len(parameters)*generating_class.size[0],
-            repeat_perp*generating_class.size[1]
-        )
-    else:
-        size = (
-            repeat_perp*generating_class.size[0],
-            repeat_para*len(parameters)*generating_class.size[1]
-        )
-    for i,p in enumerate(parameters):
-        device, components = generating_class.build(p)
-        for k in range(repeat_para):
-            for j in range(repeat_perp):
-                if axis == 0:
-                    origin = ((i*repeat_para+k)*generating_class.size[0], j*generating_class.size[1])
-                elif axis == 1:
-                    origin = (j*generating_class.size[0], (i*repeat_para+k)*generating_class.size[1])                    
-                else:
-                    raise ValueError("'axis' is not 0 or 1.")
-                origin = (origin[0] - size[0]/2 + generating_class.size[0]/2, origin[1] - size[1]/2 + generating_class.size[1]/2)
-                if has_overlap(generating_class, origin, exclusions):
-                    continue
-                ref = place_device(generating_class, device, origin, count, 
-                    label_fmt | {"schema": label_schema},
-                    components["label_pos"])
-                array.add(ref)
-                count += 1
+    placements = iter_placements(generating_class, [parameters], count_0, axis, 
+        repeat_perp, repeat_para, exclusions=exclusions, executor=executor, state=state)
+    _place_all(array, generating_class, placements, label_schema, label_fmt, label_mode)
     devices = get_children(array)
     return array, devices
 
@@ -196,8 +805,11 @@ def make_multiparam_array(
         repeat_perp: int=1,
         repeat_para: int=1,
         meta_rc: int=1,
-        exclusions: list[gdstk.Polygon]=[],
+        exclusions: list[gdstk.Polygon] | np.ndarray | ExclusionIndex=[],
         exclusion_type: str="skip",
+        executor: concurrent.futures.Executor | None=None,
+        state: ArrayState | None=None,
+        label_mode: str="device",
         ) -> tuple[gdstk.Cell, list[gdstk.Cell]]:
     """Make an array with multiple parameters swept across rows and columns.
         
@@ -211,7 +823,8 @@ def make_multiparam_array(
     label_schema: str, optional
         The format the labels should take. Should be a valid str.format 
         template. Defaults to "D-{x:03d}" which evaluates to e.g. "D-056". If
-        is empty string, no label is added.
+        is empty string, no label is added and repeated devices are placed 
+        as arrays of references (AREFs).
     count_0 : int, optional
         Initial value to label devices from. Defaults to 1.
     axis : int, optional
@@ -230,12 +843,29 @@ def make_multiparam_array(
         [2, 2, 5, 5]
         [3, 3, 6, 6]
         Defaults to 1.
-    exclusions : list of gdstk.Polygon1, optional
-        Areas where a device should not be placed. No device is placed if it 
-        would touch any of these areas. Defaults to an empty list.
+    exclusions : list of gdstk.Polygon, numpy.ndarray or ExclusionIndex, optional
+        Areas where a device should not be placed, an array is read as 
+        (N, 2, 2) boxes. No device is placed if it would touch any of these 
+        areas. Defaults to an empty list.
     exclusion_type : str, optional
         Whether a device inside an exclusion should be skipped or place in the 
-        next position. Defaults to "skip" which means that device is voided.
+        next position. Defaults to "skip" which means that device is voided. 
+        Any other value shifts the remaining devices into the next free 
+        positions, dropping those that no longer fit.
+    executor : concurrent.futures.Executor or None, optional
+        Executor used to build the devices of the unique parameter sets, e.g. 
+        a ProcessPoolExecutor. If None, devices are built serially. Defaults 
+        to None.
+    state : ArrayState or None, optional
+        Record of the devices built for this array previously. Only devices 
+        of new or changed parameter sets are built. Defaults to None.
+    label_mode : str, optional
+        Where labels are placed. "device" wraps every device and its label in 
+        its own cell. "array" references the devices directly from the array 
+        cell and adds the labels to it, "cell" does the same but collects all 
+        labels in a single label cell referenced by the array. The latter two 
+        avoid creating a cell per device, but then the array's references no 
+        longer correspond to its devices. Defaults to "device".
     
     Returns
     -------
@@ -244,52 +874,9 @@ def make_multiparam_array(
     list of gdstk.Cell
         All cells under the array cell, including the array cell itself.
     """
-    combinations = list(itertools.product(*parameters))
     array = gdstk.Cell(FabString(f"Array_{generating_class.name}"))
-    coord_sequence = []
-    if axis == 0:
-        col_per_row = len(combinations)*repeat_para // meta_rc
-        for i in range(len(combinations)*repeat_para):
-            y_offset = generating_class.size[1] * repeat_perp * (i // col_per_row)
-            x_offset = generating_class.size[0] * (i % col_per_row)
-            for r in range(repeat_perp):
-                coord_sequence.append(
-                    (x_offset, 
-                    y_offset + generating_class.size[1] * r)
-                )
-    elif axis == 1:
-        row_per_col = len(combinations)*repeat_para // meta_rc
-        for i in range(len(combinations)*repeat_para):
-            x_offset = generating_class.size[0] * repeat_perp * (i // row_per_col)
-            y_offset = generating_class.size[1] * (i % row_per_col)
-            for r in range(repeat_perp):
-                coord_sequence.append(
-                    (x_offset + generating_class.size[0] * r, 
-                     y_offset)
-                )
-    else:
-        raise ValueError("'axis' is not 0 or 1.")
-    idx = 0
-    count = count_0
-    for parameter_set in combinations:
-        device, components = generating_class.build(*parameter_set)
-        for r in range(repeat_perp*repeat_para):
-            if has_overlap(generating_class, coord_sequence[idx], exclusions):
-                if exclusion_type != "skip":
-                    r -= 1    
-                idx += 1
-                continue
-            # centre array around 0
-            origin = (
-                coord_sequence[idx][0] - coord_sequence[-1][0]/2,
-                coord_sequence[idx][1]- coord_sequence[-1][1]/2
-            )
-            ref = place_device(generating_class, device, origin, count, 
-                    label_fmt | {"schema": label_schema},
-                    components["label_pos"]
-                    )
-            array.add(ref)
-            idx += 1
-            count += 1
+    placements = iter_placements(generating_class, parameters, count_0, axis, 
+        repeat_perp, repeat_para, meta_rc, exclusions, exclusion_type, executor, state)
+    _place_all(array, generating_class, placements, label_schema, label_fmt, label_mode)
     devices = get_children(array)
-    return array, devices
\ No newline at end of file
+    return array, devices
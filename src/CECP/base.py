@@ -1,7 +1,8 @@
 from abc import ABC, abstractmethod
 import gdstk
 
-from .format import Formatter
+from .format import Formatter, LayerMap
+from . import parallel
 
 class Feature(ABC):
     """Base class that all device classes should inherit from.
@@ -11,7 +12,7 @@ class Feature(ABC):
     """
     def __init__(self, name: str, layer_map: dict[str: Formatter], bounds: gdstk.Polygon) -> None:
         self.name = name
-        self.layer_map = layer_map
+        self.layer_map = layer_map if isinstance(layer_map, LayerMap) else LayerMap(layer_map)
         self.bounds = bounds
         (x0, y0), (x1, y1) = bounds.bounding_box()
         self.size = (x1 - x0, y1 - y0)
@@ -33,6 +34,16 @@ class Feature(ABC):
         """
         pass
 
+    def __getstate__(self) -> dict:
+        """Makes features picklable, e.g. to build devices in worker 
+        processes. The main cell is recreated empty on unpickling."""
+        state = {k: v for k, v in self.__dict__.items() if k != "main_cell"}
+        return parallel.pack(state)
+
+    def __setstate__(self, state: dict) -> None:
+        self.__dict__.update(parallel.unpack(state))
+        self.main_cell = gdstk.Cell(self.name)
+
     def get_label_loc(self) -> tuple[float, float]:
         """Get the position where a label should be centred.
         
@@ -51,11 +62,13 @@ class FabString(str):
     
     The string type is slightly more tedious to inherit from apparently.
     """
+    max_len = 47 # might not be absolute max length
+
     def __new__(cls, text, **kw):
         if type(text) is not str:
             raise TypeError(f"Expected string, got {type(text)}.")
         legal_characters = "abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789_"
-        max_len = 47 # might not be absolute max length
+        max_len = cls.max_len
         if "." in text:
             text = text.replace(".", "p")
         illegal_chars = {char for char in text if char not in legal_characters}
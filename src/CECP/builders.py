@@ -3,12 +3,13 @@ import gdstk
 import numpy as np
 
 from .clearance import Clearance
+from .utils.helpers import mask_rectangles
 
 def make_via(
     polygon: gdstk.Polygon | list[gdstk.Polygon],
     clearance: Clearance=Clearance(2),
     subdivide: None | gdstk.Cell | gdstk.Polygon=None, 
-    ) -> list[gdstk.Polygon]:
+    ) -> list[gdstk.Polygon] | list[gdstk.Reference]:
     """
     
     Parameters
@@ -19,30 +20,59 @@ def make_via(
         How much to reduce via size with respect to the polygon. Defaults to 2.
     subdivide : None or gdstk.Polygon or gdstk.Cell, optional
         Whether to divide the area into smaller vias. Defaults to None. If is a 
-        polygon this will used as the via.
+        polygon this will used as the via. If it is a cell, it is placed by 
+        references, with one rectangular repetition per block of vias.
     
     Returns
     -------
-    list of gdstk.Polygon
-    # ! todo add: cell capability here
+    list of gdstk.Polygon or list of gdstk.Reference
+        References if subdivide is a cell. Formatter.apply accepts both.
     """
     # might use layer later (e.g. for polarity?)
     if isinstance(subdivide, gdstk.Cell):
-        raise NotImplementedError()
-    elif isinstance(subdivide, gdstk.Polygon):
+        if subdivide.bounding_box() is None:
+            raise ValueError(f"Via cell {subdivide.name} is empty.")
         (x0, y0), (x1, y1) = subdivide.bounding_box()
         size_via = (x1 - x0, y1 - y0)
         subdivide_rect = gdstk.rectangle((x0, y0), (x1, y1))
         shrunk_polygon = clearance.apply_clearance(polygon, sign=-1)[0]
         (x0, y0), (x1, y1) = shrunk_polygon.bounding_box()
         shrunk_polygon_rect = gdstk.rectangle((x0, y0), (x1, y1))
+        xs, ys = _layout_axes(shrunk_polygon_rect, subdivide_rect, np.max(size_via)/2)
+        origins = np.stack(np.meshgrid(xs, ys, indexing="ij"), axis=-1)
+        corners = np.array(subdivide.bounding_box())
+        inside = np.array(gdstk.inside(
+            (origins[:, :, None, :] + corners[None, None, :, :]).reshape(-1, 2), shrunk_polygon
+        )).reshape(len(xs), len(ys), 2)
+        spacing = (xs[1] - xs[0] if len(xs) > 1 else 0, ys[1] - ys[0] if len(ys) > 1 else 0)
         via = []
-        for origin in layout(shrunk_polygon_rect, subdivide_rect, np.max(size_via)/2):
-            sub_via = subdivide.copy()
-            sub_via.translate(origin)
-            if shrunk_polygon.contain_all(*sub_via.bounding_box()):
-                via.append(sub_via)
+        # rows of the mask run along x
+        for i, j, n_x, n_y in mask_rectangles(inside.all(axis=2)):
+            if n_x == 1 and n_y == 1:
+                via.append(gdstk.Reference(subdivide, (xs[i], ys[j])))
+            else:
+                via.append(gdstk.Reference(subdivide, (xs[i], ys[j]), columns=n_x, rows=n_y, spacing=spacing))
         return via
+    elif isinstance(subdivide, gdstk.Polygon):
+        (x0, y0), (x1, y1) = subdivide.bounding_box()
+        size_via = (x1 - x0, y1 - y0)
+        subdivide_rect = gdstk.rectangle((x0, y0), (x1, y1))
+        shrunk_polygon = clearance.apply_clearance(polygon, sign=-1)[0]
+        (x0, y0), (x1, y1) = shrunk_polygon.bounding_box()
+        shrunk_polygon_rect = gdstk.rectangle((x0, y0), (x1, y1))
+        origins = layout_origins(shrunk_polygon_rect, subdivide_rect, np.max(size_via)/2)
+        # a sub via fits if both corners of its bounding box are inside
+        corners = np.array(subdivide.bounding_box())
+        inside = np.array(gdstk.inside(
+            (origins[:, None, :] + corners[None, :, :]).reshape(-1, 2), shrunk_polygon
+        )).reshape(-1, 2)
+        accepted = origins[inside.all(axis=1)]
+        if len(accepted) == 0:
+            return []
+        # only the accepted sub vias are created, in one go
+        via = subdivide.copy()
+        via.repetition = gdstk.Repetition(offsets=accepted)
+        return via.apply_repetition()
     via = clearance.apply_clearance(polygon, sign=-1)
     return via
 
@@ -70,6 +100,35 @@ def layout(big_rectangle: gdstk.Polygon, small_rectangle: gdstk.Polygon, separat
         The centre coordinates of the small rectangles so they are distributed 
         inside the larger rectangle.
     """
+    return [(x, y) for x, y in layout_origins(big_rectangle, small_rectangle, separation).tolist()]
+
+
+def layout_origins(big_rectangle: gdstk.Polygon, small_rectangle: gdstk.Polygon, separation: float) -> np.ndarray:
+    """Same as layout, but returns the coordinates as (N, 2) array.
+    
+    Parameters
+    ----------
+    big_rectangle : gdstk.polygon
+        Rectangular bounds in which smaller rectangle should be distributed.
+    small_rectangle
+        Rectangular bounds to determine where the shapes can be placed inside 
+        larger rectangle.
+    separation : float
+        How much space to have between two rectangles.
+    
+    Returns
+    -------
+    numpy.ndarray
+        The centre coordinates of the small rectangles, in the same order as 
+        layout.
+    """
+    xs, ys = _layout_axes(big_rectangle, small_rectangle, separation)
+    x, y = np.meshgrid(xs, ys, indexing="ij")
+    return np.column_stack((x.ravel(), y.ravel()))
+
+
+def _layout_axes(big_rectangle: gdstk.Polygon, small_rectangle: gdstk.Polygon, separation: float) -> tuple[np.ndarray, np.ndarray]:
+    """The x and y coordinates of the grid used by layout."""
     (x0, y0), (x1, y1) = big_rectangle.bounding_box()
     big_size = (x1 - x0, y1 - y0)
     big_origin = (x0 + big_size[0]/2, y0 + big_size[1]/2)
@@ -84,14 +143,7 @@ def layout(big_rectangle: gdstk.Polygon, small_rectangle: gdstk.Polygon, separat
         x_shift += small_size[0] / 2
     if y_num % 2 == 0 or y_num == 1:
         y_shift += small_size[1] / 2
-    coords = []
-    for x in range(x_num):
-        for y in range(y_num):
-            coords.append(
-                (
-                    big_origin[0] + x_shift + x * small_size[0],
-                    big_origin[1] + y_shift + y * small_size[1],
-                )
-            )
-    return coords
-    
\ No newline at end of file
+    return (
+        big_origin[0] + x_shift + np.arange(x_num) * small_size[0],
+        big_origin[1] + y_shift + np.arange(y_num) * small_size[1],
+    )
@@ -0,0 +1,290 @@
+# process wide caches, so identical devices are only generated once
+import collections
+import gdstk
+import hashlib
+import numpy as np
+
+
+def freeze(obj) -> object:
+    """Converts an object into a hashable key.
+
+    Containers are converted recursively, polygons and arrays by their point
+    buffers. Objects providing a cache_key method (e.g. Formatter) are keyed
+    by its result. Anything else must be hashable itself, in which case it is
+    keyed by its own hash (identity for most objects, e.g. gdstk.Cell).
+
+    Parameters
+    ----------
+    obj : object
+        The object to convert.
+
+    Returns
+    -------
+    object
+        A hashable representation of obj.
+
+    Raises
+    ------
+    TypeError
+        If the object can not be converted.
+    """
+    if obj is None or isinstance(obj, (bool, int, float, str, bytes)):
+        return obj
+    if isinstance(obj, (list, tuple)):
+        return (type(obj).__name__, tuple(freeze(item) for item in obj))
+    if isinstance(obj, dict):
+        return ("dict", tuple(sorted(((repr(k), freeze(v)) for k, v in obj.items()), key=lambda kv: kv[0])))
+    if isinstance(obj, (set, frozenset)):
+        return ("set", frozenset(freeze(item) for item in obj))
+    if isinstance(obj, np.ndarray):
+        return ("ndarray", obj.shape, obj.dtype.str, obj.tobytes())
+    if isinstance(obj, gdstk.Polygon):
+        return ("Polygon", obj.layer, obj.datatype, obj.points.tobytes())
+    if hasattr(obj, "cache_key"):
+        return (type(obj).__name__, freeze(obj.cache_key()))
+    hash(obj)
+    return obj
+
+
+def feature_key(feature) -> tuple:
+    """Key identifying a Feature instance by its class and state.
+
+    Covers the constructor arguments (layer_map formatters, bounds) as well as
+    any further attributes set by subclasses. The main cell is excluded, as
+    every instance creates its own.
+
+    Parameters
+    ----------
+    feature : Feature
+        The feature to key.
+
+    Returns
+    -------
+    tuple
+    """
+    state = {k: v for k, v in vars(feature).items() if k != "main_cell"}
+    return (type(feature), freeze(state))
+
+
+class LRUCache:
+    """Least recently used cache with a maximum number of entries.
+
+    Keeps count of hits, misses and evictions.
+    """
+    def __init__(self, maxsize: int | None=256) -> None:
+        """
+        Parameters
+        ----------
+        maxsize : int or None, optional
+            Maximum number of entries before the least recently used one is
+            evicted. None means no limit. Defaults to 256.
+        """
+        self.maxsize = maxsize
+        self.entries = collections.OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, default=None):
+        """Returns the entry for key, or default if it is not cached. Counts
+        as hit or miss."""
+        try:
+            value = self.entries[key]
+        except KeyError:
+            self.misses += 1
+            return default
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key, value) -> None:
+        """Stores value under key, evicting old entries if necessary."""
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+        while self.maxsize is not None and len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self) -> None:
+        """Removes all entries and resets the counters."""
+        self.entries.clear()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def stats(self) -> dict:
+        """Returns the current size and hit/miss/eviction counts."""
+        return {
+            "size": len(self.entries),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def __contains__(self, key) -> bool:
+        return key in self.entries
+
+    def __repr__(self):
+        return f"<{type(self).__name__}: {self.stats()}>"
+
+
+class BuildCache(LRUCache):
+    """Memoises Feature.build, keyed by the feature class, its state and the
+    build arguments.
+
+    Cached calls return the already built gdstk.Cell, so identical devices
+    are shared between arrays instead of being generated again. The cell and
+    its children are the same objects for every caller and must not be
+    modified, e.g. by filtering polygons from them. Copy them first if
+    needed.
+
+    Disabled by default.
+
+    Example
+    -------
+    >>> build_cache.enabled = True
+    >>> fecap = FeCAP_small(layer_map)
+    >>> device, components = build_cache.build(fecap, 30.0)
+    >>> device is build_cache.build(fecap, 30.0)[0]
+    True
+    """
+    def __init__(self, maxsize: int | None=256, enabled: bool=False) -> None:
+        """
+        Parameters
+        ----------
+        maxsize : int or None, optional
+            Maximum number of devices kept. Defaults to 256.
+        enabled : bool, optional
+            If False, build always calls through to the feature. Defaults to
+            False.
+        """
+        super().__init__(maxsize)
+        self.enabled = enabled
+
+    def key(self, feature, *args, **kwargs) -> tuple | None:
+        """Key for a build call, None if the arguments can not be keyed."""
+        try:
+            return (feature_key(feature), freeze(args), freeze(kwargs))
+        except TypeError:
+            return None
+
+    def build(self, feature, *args, **kwargs) -> tuple[gdstk.Cell, dict]:
+        """Calls feature.build(*args, **kwargs), unless the result is cached.
+
+        Parameters
+        ----------
+        feature : Feature
+            The feature to build.
+        *args, **kwargs
+            Arguments passed to build.
+
+        Returns
+        -------
+        gdstk.Cell
+            The cell representing the device, shared with other callers if
+            the cache is enabled.
+        dict
+            A copy of the components of the device.
+        """
+        key = self.key(feature, *args, **kwargs) if self.enabled else None
+        if key is None:
+            return feature.build(*args, **kwargs)
+        cached = self.get(key)
+        if cached is None:
+            cached = feature.build(*args, **kwargs)
+            self.put(key, cached)
+        device, components = cached
+        return device, components.copy()
+
+
+build_cache = BuildCache()
+
+
+def geometry_hash(polygons: list[gdstk.Polygon]) -> bytes:
+    """Digest of the point buffers of a list of polygons, in order.
+
+    Layers and datatypes are not included.
+
+    Parameters
+    ----------
+    polygons : list of gdstk.Polygon
+        The polygons to hash.
+
+    Returns
+    -------
+    bytes
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    for polygon in polygons:
+        points = polygon.points
+        # the length separates polygons whose points would concatenate equally
+        digest.update(len(points).to_bytes(4, "little"))
+        digest.update(points.tobytes())
+    return digest.digest()
+
+
+class FormatCache(LRUCache):
+    """Memoises Formatter.apply, keyed by the formatter settings, the bounds
+    and a hash of the input geometry.
+
+    Disabled by default. Only formats with isolation, resolution separation
+    or inversion are cached, as merely setting the layer is cheaper than
+    hashing. Cached results are returned as copies.
+
+    Example
+    -------
+    >>> format_cache.enabled = True
+    >>> fecap = FeCAP_small(layer_map)
+    >>> fecap.build(30.0)
+    >>> format_cache.stats()
+    """
+    def __init__(self, maxsize: int | None=1024, enabled: bool=False) -> None:
+        """
+        Parameters
+        ----------
+        maxsize : int or None, optional
+            Maximum number of results kept. Defaults to 1024.
+        enabled : bool, optional
+            Whether results are cached. Defaults to False.
+        """
+        super().__init__(maxsize)
+        self.enabled = enabled
+
+    def key(self, formatter, polygons: list[gdstk.Polygon], bounding_polygon: gdstk.Polygon | None) -> tuple:
+        """Key for formatting polygons with formatter inside bounding_polygon."""
+        bounds = None if bounding_polygon is None else bounding_polygon.points.tobytes()
+        return (formatter.cache_key(), bounds, geometry_hash(polygons))
+
+    def apply(self, formatter, polygons: list[gdstk.Polygon], bounding_polygon: gdstk.Polygon | None, function) -> list[gdstk.Polygon]:
+        """Returns function(polygons, bounding_polygon), unless the result is
+        cached.
+
+        Parameters
+        ----------
+        formatter : Formatter
+            The formatter applied, used for the key.
+        polygons : list of gdstk.Polygon
+            The flattened input polygons.
+        bounding_polygon : gdstk.Polygon or None
+            The bounding polygon used for inversion.
+        function : callable
+            Computes the formatted polygons on a miss.
+
+        Returns
+        -------
+        list of gdstk.Polygon
+            Copies of the formatted polygons.
+        """
+        key = self.key(formatter, polygons, bounding_polygon)
+        cached = self.get(key)
+        if cached is None:
+            cached = [p.copy() for p in function(polygons, bounding_polygon)]
+            self.put(key, cached)
+        return [p.copy() for p in cached]
+
+
+format_cache = FormatCache()
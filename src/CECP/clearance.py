@@ -1,5 +1,9 @@
 import gdstk
 import logging
+import numpy as np
+
+from . import operations
+from .utils.helpers import box_polygons, rectangle_corners
 
 """
 here sign means:
@@ -26,7 +30,12 @@ class Clearance:
     
     def apply_clearance(self, polygon, sign=1, **kwargs):
         """Returns list of polygons with the clearance applied.
+        
+        Axis-aligned rectangles are computed directly from their corners, which also supports anisotropic clearances.
         """
+        corners = rectangle_corners(polygon) if sign != 0 else None
+        if corners is not None:
+            return self._apply_kwargs(self._clear_rectangle(corners, sign), **kwargs)
         if self.fixed[0] != self.fixed[1]:
             logging.warning("Non-uniform fixed clearance is not implemented (yet?) for arbitrary polygons. Resorting to uniform clearance using the largest value. Alternatively use a bounding box based approach")
         scaled_polygon = self._apply_scale(polygon, self.perc[0], self.perc[1], sign)
@@ -43,27 +52,82 @@ class Clearance:
         return self._apply_kwargs(result, **kwargs)
     
     def apply_clearances(self, *polygons, xor=False, sign=1, **kwargs):
+        """Returns list of polygons with the clearance applied to all supplied polygons.
+        
+        Without xor, axis-aligned rectangles are cleared individually as in apply_clearance, while growing clearances 
+        offset all other polygons in one call, so their overlapping results are returned merged.
+        With xor, the individual results are combined by xor in a balanced pairwise reduction.
         """
-        """
-        cleared_polygons = []
-        for polygon in polygons:
-            if xor:
-                cleared_polygons = gdstk.boolean(cleared_polygons, self.apply_clearance(polygon), "xor")
+        if xor:
+            cleared_polygons = self._xor_reduce([self.apply_clearance(polygon, sign=sign) for polygon in polygons])
+        else:
+            if sign*self.fixed[0] >= 0:
+                cleared_polygons = []
+                scaled_polygons = []
+                for polygon in polygons:
+                    corners = rectangle_corners(polygon) if sign != 0 else None
+                    if corners is not None:
+                        cleared_polygons += self._clear_rectangle(corners, sign)
+                    else:
+                        scaled_polygons.append(self._apply_scale(polygon, self.perc[0], self.perc[1], sign))
+                if scaled_polygons:
+                    if self.fixed[0] != self.fixed[1]:
+                        logging.warning("Non-uniform fixed clearance is not implemented (yet?) for arbitrary polygons. Resorting to uniform clearance using the largest value. Alternatively use a bounding box based approach")
+                    # growing distributes over the union, so one call gives the same area
+                    cleared_polygons += gdstk.offset(scaled_polygons, sign*self.fixed[0])
             else:
-                cleared_polygons += self.apply_clearance(polygon, sign=sign)
+                cleared_polygons = []
+                for polygon in polygons:
+                    cleared_polygons += self.apply_clearance(polygon, sign=sign)
         return self._apply_kwargs(cleared_polygons, **kwargs)
     
     def get_clearance_bboxes(self, *polygons, xor=False, sign=1, **kwargs):
+        """Returns list of the clearance bounding boxes of all supplied polygons.
+        
+        With xor, the bounding boxes are combined by xor in a balanced pairwise reduction.
         """
-        """
-        cleared_polygons = []
-        for polygon in polygons:
-            if xor:
-                cleared_polygons = gdstk.boolean(cleared_polygons, self.get_clearance_bbox(polygon, sign=sign), "xor")
-            else:
-                cleared_polygons += self.get_clearance_bbox(polygon, sign=sign)
+        cleared_polygons = box_polygons(self.get_clearance_bbox_array(polygons, sign=sign)) if polygons else []
+        if xor:
+            cleared_polygons = self._xor_reduce([[polygon] for polygon in cleared_polygons])
         return self._apply_kwargs(cleared_polygons, **kwargs)
     
+    def get_clearance_bbox_array(self, polygons, sign=1) -> np.ndarray:
+        """Returns the bounding boxes of many polygons with the clearance applied, as array.
+        
+        Same result as get_clearance_bbox for each polygon, without creating polygon objects. Use 
+        utils.helpers.box_polygons to convert the result if polygons are needed.
+        
+        Parameters
+        ----------
+        polygons : list of gdstk.Polygon or numpy.ndarray
+            The polygons, or their (N, 2, 2) bounding boxes. Boxes are scaled about their centre, polygons 
+            about the mean of their points like everywhere else.
+        sign : int, should be -1 or 1
+            Direction in which to apply the clearance. Defaults to 1.
+        
+        Returns
+        -------
+        numpy.ndarray
+            (N, 2, 2) array of ((xmin, ymin), (xmax, ymax)). Boxes shrunk below zero size keep their swapped 
+            corners, same as get_clearance_bbox.
+        """
+        if sign == 0:
+            raise NotImplementedError()
+        if isinstance(polygons, np.ndarray):
+            boxes = polygons.astype(float).reshape(-1, 2, 2)
+            centroids = boxes.mean(axis=1)
+        else:
+            boxes = np.array([polygon.bounding_box() for polygon in polygons], dtype=float).reshape(-1, 2, 2)
+            centroids = np.array([polygon.points.mean(axis=0) for polygon in polygons], dtype=float).reshape(-1, 2)
+        factor = 1 + sign*np.array(self.perc, dtype=float)
+        scaled = centroids[:, None, :] + (boxes - centroids[:, None, :])*factor
+        # negative factors mirror the box
+        scaled.sort(axis=1)
+        fixed = sign*np.array(self.fixed, dtype=float)
+        scaled[:, 0] -= fixed
+        scaled[:, 1] += fixed
+        return scaled
+
     def get_boundary_clearance(self, polygon, sign=1, **kwargs):
         """Returns polygon which is the clearance itself, without the actual polygon
         
@@ -83,22 +147,56 @@ class Clearance:
             )
         return self._apply_kwargs(result, **kwargs)
     
-    def fill_to_bbox(self, polygons, bbox_polygon, excl_polygon=True, **kwargs):
+    def fill_to_bbox(self, polygons, bbox_polygon, excl_polygon=True, tiles=None, executor=None, **kwargs):
         """
         excl_polygon controls whether the original polygons should also be included in the final output.
         only defined for enlarging (positive sign)
+        
+        All clearances are subtracted from the bounding box in a single boolean. For very large bounding boxes, 
+        tiles and executor are passed to operations.tiled_boolean to process it in tiles.
         """
-        result = bbox_polygon.copy()
-        for polygon in polygons:
-            if not excl_polygon:
-                clearance_poly = gdstk.boolean(
+        if len(polygons) == 0:
+            return self._apply_kwargs(bbox_polygon.copy(), **kwargs)
+        if not excl_polygon:
+            clearance_polys = []
+            for polygon in polygons:
+                clearance_polys += gdstk.boolean(
                     self.apply_clearance(polygon, sign=1),
                     polygon, "not")
-            else:
-                clearance_poly = self.apply_clearance(polygon, sign=1)
-            result = gdstk.boolean(result, clearance_poly, "not")
+        else:
+            clearance_polys = self.apply_clearances(*polygons, sign=1)
+        if tiles is not None:
+            result = operations.tiled_boolean(bbox_polygon, clearance_polys, "not", tiles, executor)
+        else:
+            result = gdstk.boolean(bbox_polygon, clearance_polys, "not")
         return self._apply_kwargs(result, **kwargs)
     
+    @staticmethod
+    def _xor_reduce(groups: list[list[gdstk.Polygon]]) -> list[gdstk.Polygon]:
+        """Combines groups of polygons by xor, pairing neighbouring groups in 
+        each round so every boolean works on similarly sized inputs.
+        
+        Parameters
+        ----------
+        groups : list of list of gdstk.Polygon
+            The operands of the xor.
+        
+        Returns
+        -------
+        list of gdstk.Polygon
+        """
+        if len(groups) == 0:
+            return []
+        if len(groups) == 1:
+            # same as a fold starting from an empty list
+            return gdstk.boolean(groups[0], [], "xor")
+        while len(groups) > 1:
+            paired = [gdstk.boolean(a, b, "xor") for a, b in zip(groups[::2], groups[1::2])]
+            if len(groups) % 2:
+                paired.append(groups[-1])
+            groups = paired
+        return groups[0]
+
     @staticmethod
     def _apply_kwargs(poly_obj, **kwargs):
         """Helper to apply polygon keyword arguments (e.g. layer/dataype).
@@ -143,7 +241,37 @@ class Clearance:
             logging.info("No scaling applied, behaviour for sign=0 not defined.")
             return polygon
         centroid = polygon.points.mean(axis=0)
-        return polygon.scale(1+sign*sx, 1+sign*sy, centroid)
+        # scale works in place, the supplied polygon must not change
+        return polygon.copy().scale(1+sign*sx, 1+sign*sy, centroid)
+
+    def _clear_rectangle(self, corners: tuple[tuple[float, float], tuple[float, float]], sign: int) -> list[gdstk.Polygon]:
+        """Applies scale and fixed clearance to a rectangle given by its corners.
+        
+        Gives the same result as scaling and gdstk.offset: snapped to 1 nm, with the same point order, on layer 0 and 
+        empty if the rectangle vanishes. Unlike offset, the fixed clearance can differ between x and y.
+        
+        Parameters
+        ----------
+        corners : ((float, float), (float, float))
+            Lower left and upper right corner.
+        sign : int, should be -1 or 1
+            Direction in which to apply the clearance.
+        
+        Returns
+        -------
+        list of gdstk.Polygon
+        """
+        (x0, y0), (x1, y1) = corners
+        cx, cy = (x0 + x1)/2, (y0 + y1)/2
+        half_x = abs(x1 - x0)/2 * abs(1 + sign*self.perc[0])
+        half_y = abs(y1 - y0)/2 * abs(1 + sign*self.perc[1])
+        # like offset, snap the scaled rectangle to the grid before growing it
+        scaled = np.round(np.array([cx - half_x, cy - half_y, cx + half_x, cy + half_y]) / 1e-3)
+        grow = sign*np.array([-self.fixed[0], -self.fixed[1], self.fixed[0], self.fixed[1]]) / 1e-3
+        x0, y0, x1, y1 = np.round(scaled + grow) * 1e-3
+        if x1 <= x0 or y1 <= y0:
+            return []
+        return [gdstk.Polygon([(x1, y1), (x0, y1), (x0, y0), (x1, y0)])]
 
     @staticmethod
     def _offset_bbox(polygon: gdstk.Polygon, ox: float, oy: float, sign: int)-> gdstk.Polygon:
@@ -1,6 +1,8 @@
 import gdstk
 import numpy as np
 
+from .base import FabString
+
 
 def make_label(text: str, size: float=30, origin: tuple[float, float]=(0, 0), rotation: float=0, vertical: bool=False, layer: int=0, datatype: int=0) -> list[gdstk.Polygon]:
     """Create text label and centre at (0, 0).
@@ -50,4 +52,114 @@ def make_label(text: str, size: float=30, origin: tuple[float, float]=(0, 0), ro
             polygon.translate(*(-1 * np.mean(bbox, axis=0)))
             polygon.translate(origin)
     return text_polygons
-    
\ No newline at end of file
+    
+
+class LabelEngine:
+    """Builds labels from references to shared glyph cells.
+    
+    Each character is converted to polygons and formatted once per size, 
+    rotation, orientation and format, labels then only consist of a handful 
+    of references. The placement matches make_label.
+    """
+    ratio = 16/11 # see make_label
+    # advance between characters of the gdstk font, in units of size/16
+    advance = {False: (9, 0), True: (0, -18)}
+    
+    def __init__(self) -> None:
+        self.glyphs = {}
+        self.names = set()
+
+    def glyph(self, char: str, size: float, rotation: float, vertical: bool, formatter, bounds: gdstk.Polygon | None=None) -> tuple[gdstk.Cell | None, np.ndarray | None]:
+        """Returns the glyph cell of a character and the bounding box of its 
+        unformatted polygons.
+        
+        Parameters
+        ----------
+        char : str
+            The character.
+        size : float
+            The heigh in um of a capitalised letter.
+        rotation : float
+            Angle by which to rotate the glyph in degrees.
+        vertical : bool
+            Whether the text is written vertically.
+        formatter : Formatter
+            Format to apply to the glyph polygons.
+        bounds : gdstk.Polygon or None, optional
+            Bounding polygon passed on to the formatter. Defaults to None.
+        
+        Returns
+        -------
+        gdstk.Cell or None
+            The glyph cell, None if the character has no polygons (e.g. space).
+        numpy.ndarray or None
+            Bounding box of the glyph, None if the character has no polygons.
+        """
+        key = (char, size, rotation, vertical, formatter.cache_key())
+        if key not in self.glyphs:
+            polygons = gdstk.text(char, size*self.ratio, (0, 0), vertical=vertical)
+            if len(polygons) == 0:
+                self.glyphs[key] = (None, None)
+                return self.glyphs[key]
+            [polygon.rotate(np.deg2rad(rotation)) for polygon in polygons]
+            bboxes = np.array([polygon.bounding_box() for polygon in polygons])
+            bbox = np.array([bboxes[:, 0].min(axis=0), bboxes[:, 1].max(axis=0)])
+            name = f"Glyph_{ord(char)}_S{size:g}_R{rotation % 360:g}{'V' if vertical else ''}_L{formatter.layer}_{formatter.datatype}"
+            unique_name, n = name, 0
+            while unique_name in self.names:
+                n += 1
+                unique_name = f"{name}_{n}"
+            self.names.add(unique_name)
+            cell = gdstk.Cell(FabString(unique_name))
+            cell.add(*formatter.apply(polygons, bounds))
+            self.glyphs[key] = (cell, bbox)
+        return self.glyphs[key]
+
+    def label(self, text: str, formatter, bounds: gdstk.Polygon | None=None, size: float=30, origin: tuple[float, float]=(0, 0), rotation: float=0, vertical: bool=False) -> list[gdstk.Reference] | None:
+        """Creates a label centred at origin from glyph references.
+        
+        Parameters
+        ----------
+        text : str
+            The text of the label.
+        formatter : Formatter
+            Format to apply to the label.
+        bounds : gdstk.Polygon or None, optional
+            Bounding polygon passed on to the formatter. Defaults to None.
+        size : float, optional
+            The heigh in um of a capitalised letter. Defaults to 30.
+        origin : (float, float), optional
+            The position to centre the label around. Defaults to (0, 0).
+        rotation : float, optional
+            Angle by which to rotate the text in degrees. Defaults to 0.
+        vertical : bool, optional
+            Whether to write the text vertically. Defaults to False.
+        
+        Returns
+        -------
+        list of gdstk.Reference or None
+            The references making up the label. None if the label can not be 
+            built from glyphs, as the format inverts polarity or the text 
+            contains line breaks or tabs. Use make_label instead in that case.
+        """
+        if formatter.inverts or "\n" in text or "\t" in text:
+            return None
+        step = np.array(self.advance[vertical], dtype=float) * size*self.ratio/16
+        angle = np.deg2rad(rotation)
+        rot = np.array([[np.cos(angle), -np.sin(angle)], [np.sin(angle), np.cos(angle)]])
+        placed = []
+        for i, char in enumerate(text):
+            cell, bbox = self.glyph(char, size, rotation, vertical, formatter, bounds)
+            if cell is not None:
+                placed.append((cell, bbox, rot @ (i*step)))
+        if len(placed) == 0:
+            return []
+        corners = np.array([bbox + offset for _, bbox, offset in placed])
+        centre = (corners[:, 0].min(axis=0) + corners[:, 1].max(axis=0)) / 2
+        return [
+            gdstk.Reference(cell, offset - centre + np.asarray(origin, dtype=float))
+            for cell, _, offset in placed
+        ]
+
+
+label_engine = LabelEngine()
@@ -186,46 +186,12 @@ class HallBar_design4(Feature):
         
 
         device.add(
-        *self.layer_map["MET_CH_1"].apply(channel_bar, self.bounds),
-        *self.layer_map["MET_CH_1"].apply(channel_rect_TR, self.bounds),
-        *self.layer_map["MET_CH_1"].apply(channel_rect_BR, self.bounds),
-        *self.layer_map["MET_CH_1"].apply(channel_rect_TL, self.bounds),
-        *self.layer_map["MET_CH_1"].apply(channel_rect_BL, self.bounds),
-        *self.layer_map["MET_CH_1"].apply(channel_TR, self.bounds),
-        *self.layer_map["MET_CH_1"].apply(channel_BR, self.bounds),
-        *self.layer_map["MET_CH_1"].apply(channel_TL, self.bounds),
-        *self.layer_map["MET_CH_1"].apply(channel_BL, self.bounds),
-        *self.layer_map["MET_CH_1"].apply(channel_R, self.bounds),
-        *self.layer_map["MET_CH_1"].apply(channel_L, self.bounds),
-        *self.layer_map["MET_CH_1"].apply(channel_rect_bottom, self.bounds),
-        *self.layer_map["MET_SD_2"].apply(cont_TR, self.bounds),
-        *self.layer_map["MET_SD_2"].apply(cont_BR, self.bounds),
-        *self.layer_map["MET_SD_2"].apply(cont_TL, self.bounds),
-        *self.layer_map["MET_SD_2"].apply(cont_BL, self.bounds),
-        *self.layer_map["MET_SD_2"].apply(cont_R, self.bounds),
-        *self.layer_map["MET_SD_2"].apply(cont_L, self.bounds),
-        *self.layer_map["MET_TE_3"].apply(gate, self.bounds),  
-        *self.layer_map["MET_TE_3"].apply(gate_T, self.bounds),  
-        *self.layer_map["VIA_CL_4"].apply(hzo_via_TR, self.bounds),
-        *self.layer_map["VIA_CL_4"].apply(hzo_via_BR, self.bounds),
-        *self.layer_map["VIA_CL_4"].apply(hzo_via_TL, self.bounds),
-        *self.layer_map["VIA_CL_4"].apply(hzo_via_BL, self.bounds),
-        *self.layer_map["VIA_CL_4"].apply(hzo_via_R, self.bounds),
-        *self.layer_map["VIA_CL_4"].apply(hzo_via_L, self.bounds),
-        *self.layer_map["VIA_SDG_5"].apply(pass_via_TR, self.bounds),
-        *self.layer_map["VIA_SDG_5"].apply(pass_via_BR, self.bounds),
-        *self.layer_map["VIA_SDG_5"].apply(pass_via_TL, self.bounds),
-        *self.layer_map["VIA_SDG_5"].apply(pass_via_BL, self.bounds),
-        *self.layer_map["VIA_SDG_5"].apply(pass_via_R, self.bounds),
-        *self.layer_map["VIA_SDG_5"].apply(pass_via_L, self.bounds),
-        *self.layer_map["VIA_SDG_5"].apply(pass_via_rect, self.bounds),
-        *self.layer_map["MET_M1_6"].apply(top_pad_R, self.bounds),
-        *self.layer_map["MET_M1_6"].apply(top_pad_L, self.bounds),
-        *self.layer_map["MET_M1_6"].apply(top_pad_TR, self.bounds),
-        *self.layer_map["MET_M1_6"].apply(top_pad_TL, self.bounds),
-        *self.layer_map["MET_M1_6"].apply(top_pad_BR, self.bounds),
-        *self.layer_map["MET_M1_6"].apply(top_pad_BL, self.bounds),
-        *self.layer_map["MET_M1_6"].apply(top_pad_center, self.bounds)
+        *self.layer_map["MET_CH_1"].apply([channel_bar, channel_rect_TR, channel_rect_BR, channel_rect_TL, channel_rect_BL, channel_TR, channel_BR, channel_TL, channel_BL, channel_R, channel_L, channel_rect_bottom], self.bounds),
+        *self.layer_map["MET_SD_2"].apply([cont_TR, cont_BR, cont_TL, cont_BL, cont_R, cont_L], self.bounds),
+        *self.layer_map["MET_TE_3"].apply([gate, gate_T], self.bounds),
+        *self.layer_map["VIA_CL_4"].apply([hzo_via_TR, hzo_via_BR, hzo_via_TL, hzo_via_BL, hzo_via_R, hzo_via_L], self.bounds),
+        *self.layer_map["VIA_SDG_5"].apply([pass_via_TR, pass_via_BR, pass_via_TL, pass_via_BL, pass_via_R, pass_via_L, pass_via_rect], self.bounds),
+        *self.layer_map["MET_M1_6"].apply([top_pad_R, top_pad_L, top_pad_TR, top_pad_TL, top_pad_BR, top_pad_BL, top_pad_center], self.bounds),
         )
 
    # provide access point export relevant features
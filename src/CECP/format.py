@@ -1,9 +1,17 @@
+import concurrent.futures
 import gdstk
+import hashlib
 
 from . import operations
+from .cache import LRUCache, format_cache, geometry_hash
+from .merge import HierarchyIndex
 from .utils import helpers
 
 
+# formatted copies of referenced cells, see Formatter._format_reference
+_formatted_cells = LRUCache(maxsize=1024)
+
+
 class Formatter:
     """ToDo
     """
@@ -12,7 +20,9 @@ class Formatter:
                  datatype: int=0, 
                  polarity: bool=True, 
                  isolate: bool | float=False, 
-                 separate_resolution: bool=False):
+                 separate_resolution: bool=False,
+                 defer_inversion: bool=False,
+                 simplify: bool | float=False):
         """
                 
         Parameters
@@ -27,6 +37,10 @@ class Formatter:
             Whether to isolate polygons, replacing them with an edge of a set thickness. If True the value is used as the thickness. Defaults to False.
         separate_resolution : bool, optional
             Whether to separate the polygons into fine and coarse polygons. Defaults to False. If True the layer of the fine polygons is this value added to the layer specified.
+        defer_inversion : bool, optional
+            If True and polarity is False, apply leaves the polygons un-inverted. The layer is then inverted once for the whole chip with invert_deferred. Defaults to False.
+        simplify : bool or float, optional
+            Whether to snap the result to a grid and remove duplicate and collinear points, see operations.simplify. If a float, it is used as the grid, if True the grid is 1 nm. The vertex counts before and after are added up in vertex_counts. Defaults to False.
         
         """
         self.layer = layer
@@ -34,6 +48,10 @@ class Formatter:
         self.polarity = polarity
         self.isolate = isolate
         self.separate_resolution = separate_resolution
+        self.defer_inversion = defer_inversion
+        self.simplify = simplify
+        # vertices before and after simplification, summed over all calls
+        self.vertex_counts = [0, 0]
     
     def apply(self, 
               polygon: gdstk.Polygon | list[gdstk.Polygon], 
@@ -46,7 +64,8 @@ class Formatter:
         Parameters
         ----------
         polygon : gdstk.Polygon or list of gdstk.Polygon
-            Polygons to apply the format to
+            Polygons to apply the format to. May also contain references, 
+            e.g. from make_via with a via cell.
         bounding_polygon : gdstk.Polygon or None
             Bounding polygon used for inversion operation.. Defaults to None.
         
@@ -56,6 +75,65 @@ class Formatter:
         """
         if isinstance(polygon, list):
             polygon = helpers.flatten(polygon)
+        else:
+            polygon = [polygon]
+        return self._apply_flat(polygon, bounding_polygon)
+
+    def _apply_flat(self, 
+              polygon: list[gdstk.Polygon], 
+              bounding_polygon: gdstk.Polygon | None=None
+              ) -> list[gdstk.Polygon]:
+        """Apply the format to an already flattened list of polygons. Uses 
+        format_cache if it is enabled.
+        
+        References in the list are kept as references to a copy of their cell 
+        on this layer. If the format inverts, isolates or separates 
+        resolutions, the result depends on all polygons of the layer together, 
+        so references are flattened into polygons instead."""
+        references = [p for p in polygon if isinstance(p, gdstk.Reference)]
+        if references:
+            polygon = [p for p in polygon if not isinstance(p, gdstk.Reference)]
+            if self.inverts or self.isolate or self.separate_resolution:
+                for reference in references:
+                    polygon.extend(reference.get_polygons())
+            else:
+                return self._apply_flat(polygon, bounding_polygon) + [
+                    self._format_reference(reference) for reference in references
+                ]
+        if format_cache.enabled and (self.isolate or self.separate_resolution or self.inverts or self.simplify):
+            return format_cache.apply(self, polygon, bounding_polygon, self._format)
+        return self._format(polygon, bounding_polygon)
+
+    def _format_reference(self, reference: gdstk.Reference) -> gdstk.Reference:
+        """Returns a copy of the reference pointing to a copy of its cell with 
+        the format applied.
+        
+        The formatted cells are shared between all references to cells with 
+        the same name and geometry, formatted with the same settings. Their 
+        names include a digest of both, so different cells sharing a name do 
+        not collide."""
+        cell = reference.cell
+        polygons = cell.get_polygons()
+        key = (self.cache_key(), cell.name, geometry_hash(polygons))
+        formatted = _formatted_cells.get(key)
+        if formatted is None:
+            digest = hashlib.blake2b(repr(key).encode(), digest_size=3).hexdigest()
+            formatted = gdstk.Cell(_derived_name(cell.name, f"_L{self.layer}_D{self.datatype}_{digest}"))
+            formatted.add(*self._apply_flat(polygons, None))
+            _formatted_cells.put(key, formatted)
+        copy = gdstk.Reference(
+            formatted, reference.origin, reference.rotation, 
+            reference.magnification, reference.x_reflection,
+        )
+        copy.repetition = reference.repetition
+        return copy
+
+    def _format(self, 
+              polygon: list[gdstk.Polygon], 
+              bounding_polygon: gdstk.Polygon | None=None
+              ) -> list[gdstk.Polygon]:
+        """Uncached part of _apply_flat. Stages that are not enabled are 
+        skipped without copying the polygons."""
         if self.isolate:
             polygon = operations.offset_and_subtract(polygon, self.isolate)
         if self.separate_resolution:
@@ -63,19 +141,30 @@ class Formatter:
             for p in fine:
                 p.layer = self.layer + self.separate_resolution
                 p.datatype = self.datatype
-        if not self.polarity:
+        if self.inverts:
             if bounding_polygon is None:
                 raise ValueError("No bounding polygon provided, necessary for inversion.")
-            polygon = operations.invert(polygon, bounding_polygon)
-        if isinstance(polygon, gdstk.Polygon):
-            polygon = [polygon]
-        for p in polygon:
-            p.layer = self.layer
-            p.datatype = self.datatype
+            # layer and datatype are set by the boolean itself
+            polygon = gdstk.boolean(bounding_polygon, polygon, "not", layer=self.layer, datatype=self.datatype)
+        else:
+            for p in polygon:
+                p.layer = self.layer
+                p.datatype = self.datatype
         if self.separate_resolution:
             polygon.extend(fine)
+        if self.simplify:
+            before = sum(len(p.points) for p in polygon)
+            polygon = operations.simplify(polygon, 1e-3 if self.simplify is True else self.simplify)
+            self.vertex_counts[0] += before
+            self.vertex_counts[1] += sum(len(p.points) for p in polygon)
         return polygon
     
+    @property
+    def inverts(self) -> bool:
+        """Whether apply inverts the polygons, i.e. polarity is False and the 
+        inversion is not deferred."""
+        return not self.polarity and not self.defer_inversion
+
     def filter(self, polygons: list[gdstk.Polygon]) -> list[gdstk.Polygon]:
         """Filters a list of polygons for those matching the specified layer 
         and datatype of the format.
@@ -96,6 +185,15 @@ class Formatter:
                 filtered_polygons.append(polygon)
         return filtered_polygons
         
+    def cache_key(self) -> tuple:
+        """Returns the settings that determine the result of apply.
+        
+        Returns
+        -------
+        tuple
+        """
+        return (self.layer, self.datatype, self.polarity, self.isolate, self.separate_resolution, self.defer_inversion, self.simplify)
+
     def new(self, kwargs: dict):
         """Returns a new class with modified entries.
 
@@ -114,7 +212,9 @@ class Formatter:
             "datatype": self.datatype, 
             "polarity": self.polarity, 
             "isolate": self.isolate, 
-            "separate_resolution": self.separate_resolution
+            "separate_resolution": self.separate_resolution,
+            "defer_inversion": self.defer_inversion,
+            "simplify": self.simplify,
             }
         args = args | kwargs
         return type(self)(
@@ -122,5 +222,124 @@ class Formatter:
             args["datatype"], 
             args["polarity"], 
             args["isolate"], 
-            args["separate_resolution"]
-        )
\ No newline at end of file
+            args["separate_resolution"],
+            args["defer_inversion"],
+            args["simplify"],
+        )
+
+class LayerMap(dict):
+    """Mapping of layer names to Formatter, reporting on the formatters.
+    
+    Behaves like the plain dict[str, Formatter] otherwise used as layer_map.
+    """
+    def vertex_report(self) -> dict[str, tuple[int, int]]:
+        """Vertex counts before and after simplification for each layer with 
+        simplify enabled.
+        
+        Work done in other processes or answered from format_cache is not 
+        counted.
+        
+        Returns
+        -------
+        dict of str to (int, int)
+        """
+        return {
+            key: tuple(formatter.vertex_counts) 
+            for key, formatter in self.items() if formatter.simplify
+        }
+
+
+def invert_deferred(
+        cell: gdstk.Cell, 
+        formatters, 
+        outline: gdstk.Polygon | list[gdstk.Polygon], 
+        tiles: int | tuple[int, int] | None=None,
+        executor: concurrent.futures.Executor | None=None,
+        ) -> gdstk.Cell:
+    """Inverts the layers of formatters with deferred inversion once for a 
+    whole chip.
+    
+    The polygons of each such layer are collected from the full hierarchy 
+    below cell and replaced by a single inversion against the outline, added 
+    to cell itself. Only cell itself is modified. Every cell below it holding 
+    such polygons (directly or further down) is replaced by a copy without 
+    them, named after the original with the suffix "_DI", so cells shared 
+    with other layouts (e.g. from build_cache or glyph cells) stay intact. 
+    Collect the children of cell for the library after calling this.
+    
+    Parameters
+    ----------
+    cell : gdstk.Cell
+        The top cell, e.g. the chip.
+    formatters : iterable of Formatter or dict of str to Formatter
+        The formatters to consider, e.g. a layer map. Only those with 
+        polarity False and defer_inversion True are inverted, each layer once.
+    outline : gdstk.Polygon or list of gdstk.Polygon
+        The die outline to invert against.
+    tiles : int or (int, int) or None, optional
+        If given, each inversion is processed in this many tiles, see 
+        operations.run_tiled. Defaults to None.
+    executor : concurrent.futures.Executor or None, optional
+        Executor to process the tiles with. Defaults to None.
+    
+    Returns
+    -------
+    gdstk.Cell
+        The top cell.
+    
+    Example
+    -------
+    >>> layer_map = {"MET_CH_1": Formatter(1, 0, 0, 3, 0, defer_inversion=True)}
+    >>> ...  # build and place devices into chip
+    >>> invert_deferred(chip, layer_map, gdstk.rectangle((0, 0), (10_000, 10_000)))
+    """
+    if isinstance(formatters, dict):
+        formatters = formatters.values()
+    specs = {}
+    for formatter in formatters:
+        if not formatter.polarity and formatter.defer_inversion:
+            specs[(formatter.layer, formatter.datatype)] = formatter
+    polygons = {spec: cell.get_polygons(layer=spec[0], datatype=spec[1]) for spec in specs}
+    _remove_layers(cell, list(specs))
+    for (layer, datatype), polygon in polygons.items():
+        inverted = operations.invert(polygon, outline, tiles=tiles, executor=executor)
+        for p in inverted:
+            p.layer = layer
+            p.datatype = datatype
+        cell.add(*inverted)
+    return cell
+
+
+def _remove_layers(cell: gdstk.Cell, specs: list[tuple[int, int]]) -> None:
+    """Removes the layers from cell and its hierarchy, see invert_deferred. 
+    Cells below cell are replaced by copies instead of being modified."""
+    copies = {}
+    for c in HierarchyIndex().ordered(cell):
+        if not isinstance(c, gdstk.Cell):
+            continue
+        holds = any((p.layer, p.datatype) in specs for p in c.polygons) or any(
+            (layer, datatype) in specs for path in c.paths for layer, datatype in zip(path.layers, path.datatypes)
+        )
+        retarget = [i for i, ref in enumerate(c.references) if id(ref.cell) in copies]
+        if not holds and not retarget:
+            continue
+        if c is not cell:
+            # the references of the copy still point to the original cells
+            copy = c.copy(_derived_name(c.name, "_DI"))
+            copies[id(c)] = copy
+            c = copy
+        c.filter(specs, remove=True, paths=True, labels=False)
+        for i in retarget:
+            ref = c.references[i]
+            ref.cell = copies[id(ref.cell)]
+
+
+def _derived_name(name: str, suffix: str) -> str:
+    """Name of a cell derived from the cell name, with suffix appended. If 
+    this exceeds FabString.max_len, name is shortened and a digest of it 
+    added, so derived names of different cells stay distinct."""
+    from .base import FabString
+    if len(name) + len(suffix) > FabString.max_len:
+        digest = hashlib.blake2b(name.encode(), digest_size=3).hexdigest()
+        name = f"{name[:FabString.max_len - len(suffix) - len(digest) - 1]}_{digest}"
+    return FabString(name + suffix)
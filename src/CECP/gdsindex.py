@@ -0,0 +1,271 @@
+# reads single cells from large GDS files without parsing the whole file
+import gdstk
+import json
+import logging
+import mmap
+import os
+import struct
+import tempfile
+
+from . import merge
+
+# record types, see the GDSII stream format
+BGNSTR = 0x05
+STRNAME = 0x06
+ENDSTR = 0x07
+ENDLIB = 0x04
+SNAME = 0x12
+
+INDEX_VERSION = 1
+
+
+class GDSIndex:
+    """Index of the cells in a GDS file by their byte ranges.
+
+    Only the record headers are scanned (plus the STRNAME and SNAME strings),
+    no geometry is decoded. A cell and all cells it depends on can then be
+    copied into a small temporary file and read with gdstk.
+
+    Optionally, the index is saved as a JSON sidecar next to the file (if
+    writable) and reused by later runs as long as size and modification time
+    of the file are unchanged. This is off by default, as it writes into the
+    directory of the file, e.g. the installed templates.
+
+    Example
+    -------
+    >>> index = GDSIndex("templates/BRNC_C20mm_dice.gds")
+    >>> cell, children = index.read_cell("user_design_area")
+    """
+    def __init__(self, path, sidecar: bool=False) -> None:
+        """
+        Parameters
+        ----------
+        path : str or os.PathLike
+            Path of the .gds file.
+        sidecar : bool, optional
+            Whether to load and save the index from/to path + ".idx.json".
+            Defaults to False.
+        """
+        self.path = os.path.abspath(os.fspath(path))
+        self.sidecar_path = self.path + ".idx.json" if sidecar else None
+        stat = os.stat(self.path)
+        self.size = stat.st_size
+        self.mtime = stat.st_mtime_ns
+        # library header (HEADER to UNITS) and cell name -> (start, end, dependencies)
+        self.header = (0, 0)
+        self.cells = {}
+        if not self._load():
+            self.scan()
+            self._save()
+
+    def scan(self) -> None:
+        """Builds the index by walking the record headers of the file."""
+        self.cells = {}
+        header_end = None
+        with open(self.path, "rb") as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            position = 0
+            start = name = None
+            dependencies = {}
+            while position + 4 <= len(data):
+                length, record = struct.unpack_from(">HB", data, position)
+                if length < 4:
+                    raise ValueError(f"Invalid record of length {length} at byte {position} in {self.path}.")
+                if record == BGNSTR:
+                    if header_end is None:
+                        header_end = position
+                    start = position
+                    dependencies = {}
+                elif record == STRNAME:
+                    name = _record_string(data, position, length)
+                elif record == SNAME:
+                    dependencies.setdefault(_record_string(data, position, length))
+                elif record == ENDSTR:
+                    if name in self.cells:
+                        raise ValueError(f"Multiple cells named {name} in {self.path}.")
+                    self.cells[name] = (start, position + length, list(dependencies))
+                elif record == ENDLIB:
+                    break
+                position += length
+        self.header = (0, position if header_end is None else header_end)
+
+    def closure(self, cell_name: str) -> list[str]:
+        """Names of the cell and all cells it depends on, dependencies first.
+
+        Parameters
+        ----------
+        cell_name : str
+            Name of the cell.
+
+        Returns
+        -------
+        list of str
+
+        Raises
+        ------
+        ValueError
+            If the cell is not in the file.
+        """
+        if cell_name not in self.cells:
+            raise ValueError(f"No cell named {cell_name} in {self.path}.")
+        order = []
+        seen = set()
+        stack = [(cell_name, False)]
+        while stack:
+            name, expanded = stack.pop()
+            if expanded:
+                order.append(name)
+                continue
+            if name in seen:
+                continue
+            seen.add(name)
+            stack.append((name, True))
+            # references to cells missing from the file are left unresolved
+            stack.extend((child, False) for child in self.cells[name][2] if child in self.cells and child not in seen)
+        return order
+
+    def extract(self, cell_name: str, out_path, dependencies: bool=True) -> list[str]:
+        """Writes the cell and its dependencies as a stand-alone GDS file.
+
+        Parameters
+        ----------
+        cell_name : str
+            Name of the cell.
+        out_path : str or os.PathLike
+            The file to write.
+        dependencies : bool, optional
+            If False, only the cell itself is copied and the cells it
+            references directly are written as empty stubs. Defaults to True.
+
+        Returns
+        -------
+        list of str
+            Names of the cells copied.
+        """
+        if dependencies:
+            names = self.closure(cell_name)
+            stubs = []
+        else:
+            names = self.closure(cell_name)[-1:]
+            stubs = [name for name in self.cells[cell_name][2] if name in self.cells]
+        with open(self.path, "rb") as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data, open(out_path, "wb") as out:
+            out.write(data[self.header[0]:self.header[1]])
+            for name in stubs:
+                out.write(_empty_cell(name))
+            for name in names:
+                start, end, _ = self.cells[name]
+                out.write(data[start:end])
+            out.write(struct.pack(">HBB", 4, ENDLIB, 0))
+        return names
+
+    def read_cell(self, cell_name: str, dependencies: bool=True) -> tuple[gdstk.Cell, set[gdstk.Cell]]:
+        """Reads only the cell and its dependencies with gdstk.
+
+        Parameters
+        ----------
+        cell_name : str
+            Name of the cell.
+        dependencies : bool, optional
+            If False, only the cell itself is parsed. Its references to other
+            cells are kept by name, e.g. to point them to raw cells later.
+            Defaults to True.
+
+        Returns
+        -------
+        gdstk.Cell
+            The cell specified.
+        set of gdstk.Cell
+            The cells referenced in the specfied cell, see get_children. Only
+            the cell itself if dependencies is False.
+        """
+        handle, temp_path = tempfile.mkstemp(suffix=".gds")
+        os.close(handle)
+        try:
+            self.extract(cell_name, temp_path, dependencies)
+            library = gdstk.read_gds(temp_path)
+        finally:
+            os.remove(temp_path)
+        cell = [c for c in library.cells if c.name == cell_name][0]
+        if not dependencies:
+            for reference in cell.references:
+                if isinstance(reference.cell, gdstk.Cell):
+                    reference.cell = reference.cell.name
+        return cell, merge.get_children(cell)
+
+    def _load(self) -> bool:
+        """Loads the sidecar, returns whether it matched the file."""
+        if self.sidecar_path is None or not os.path.exists(self.sidecar_path):
+            return False
+        try:
+            with open(self.sidecar_path) as file:
+                stored = json.load(file)
+        except (OSError, ValueError):
+            return False
+        if stored.get("version") != INDEX_VERSION or stored.get("size") != self.size or stored.get("mtime") != self.mtime:
+            return False
+        self.header = tuple(stored["header"])
+        self.cells = {name: (start, end, dependencies) for name, (start, end, dependencies) in stored["cells"].items()}
+        return True
+
+    def _save(self) -> None:
+        if self.sidecar_path is None:
+            return
+        stored = {
+            "version": INDEX_VERSION,
+            "size": self.size,
+            "mtime": self.mtime,
+            "header": list(self.header),
+            "cells": {name: list(entry) for name, entry in self.cells.items()},
+        }
+        try:
+            with open(self.sidecar_path, "w") as file:
+                json.dump(stored, file)
+        except OSError:
+            logging.info(f"Could not write index sidecar {self.sidecar_path}.")
+
+    def __contains__(self, cell_name: str) -> bool:
+        return cell_name in self.cells
+
+    def __len__(self) -> int:
+        return len(self.cells)
+
+    def __repr__(self):
+        return f"<GDSIndex: {self.path}, {len(self.cells)} cells>"
+
+
+def _record_string(data: mmap.mmap, position: int, length: int) -> str:
+    """Decodes the string of an ASCII record, without the null padding."""
+    return bytes(data[position + 4:position + length]).rstrip(b"\0").decode("ascii", errors="replace")
+
+
+def _empty_cell(name: str) -> bytes:
+    """Records of a cell without any elements."""
+    encoded = name.encode("ascii")
+    if len(encoded) % 2:
+        encoded += b"\0"
+    return (
+        struct.pack(">HBB12h", 28, BGNSTR, 2, *[0]*12)
+        + struct.pack(">HBB", 4 + len(encoded), STRNAME, 6) + encoded
+        + struct.pack(">HBB", 4, ENDSTR, 0)
+    )
+
+
+def read_cell(cell_name: str, path, sidecar: bool=False) -> tuple[gdstk.Cell, set[gdstk.Cell]]:
+    """Reads a single cell and its dependencies from a GDS file, see GDSIndex.
+
+    Parameters
+    ----------
+    cell_name : str
+        Name of the cell.
+    path : str or os.PathLike
+        Path of the .gds file.
+    sidecar : bool, optional
+        Whether to use a sidecar file for the index. Defaults to False.
+
+    Returns
+    -------
+    gdstk.Cell
+        The cell specified.
+    set of gdstk.Cell
+        The cells referenced in the specfied cell.
+    """
+    return GDSIndex(path, sidecar).read_cell(cell_name)
@@ -1,12 +1,119 @@
 import gdstk
 import logging
+import os
 from importlib import resources as impresources
 
 from . import templates
 
+class HierarchyIndex:
+    """Index of the cell hierarchy, walking each unique cell only once.
+    
+    The traversal is iterative, so deep hierarchies do not hit the recursion 
+    limit. Direct dependencies and full hierarchies are cached per cell for 
+    the lifetime of the index, so keep an index only as long as it is needed, 
+    e.g. while assembling one library. A cached hierarchy is reused as long 
+    as the number of references of every cell in it is unchanged. Call 
+    invalidate after otherwise modifying references, e.g. replacing one.
+    
+    The index keeps the cells it was asked about alive.
+    
+    Example
+    -------
+    >>> index = HierarchyIndex()
+    >>> lib.add(*index.ordered(array_1), *index.ordered(array_2))
+    """
+    def __init__(self) -> None:
+        self._dependencies = {}
+        self._hierarchies = {}
+
+    def dependencies(self, cell: gdstk.Cell) -> tuple[gdstk.Cell | gdstk.RawCell, ...]:
+        """Returns the unique cells referenced directly by the cell.
+        
+        Parameters
+        ----------
+        cell : gdstk.Cell
+            The cell to get the direct dependencies for.
+        
+        Returns
+        -------
+        tuple of gdstk.Cell or gdstk.RawCell
+        """
+        cached = self._dependencies.get(id(cell))
+        if cached is not None and cached[0] is cell and cached[1] == len(cell.references):
+            return cached[2]
+        children = {}
+        for ref in cell.references:
+            if not isinstance(ref.cell, str):
+                children.setdefault(id(ref.cell), ref.cell)
+        # keep the cell alive, so its id can not be reused while cached
+        self._dependencies[id(cell)] = (cell, len(cell.references), tuple(children.values()))
+        return self._dependencies[id(cell)][2]
+
+    def ordered(self, cell: gdstk.Cell) -> list[gdstk.Cell | gdstk.RawCell]:
+        """Returns all cells in the hierarchy of the cell in topological 
+        order, i.e. every cell comes after all cells it references. The cell 
+        itself is last.
+        
+        Parameters
+        ----------
+        cell : gdstk.Cell
+            The cell for which to get all cells it depends on.
+        
+        Returns
+        -------
+        list of gdstk.Cell or gdstk.RawCell
+            Ready to be passed to gdstk.Library.add.
+        """
+        cached = self._hierarchies.get(id(cell))
+        if cached is not None and cached[0] is cell and cached[1] == _reference_counts(cached[2]):
+            return list(cached[2])
+        order = []
+        seen = set()
+        stack = [(cell, False)]
+        while stack:
+            current, expanded = stack.pop()
+            if expanded:
+                order.append(current)
+                continue
+            if id(current) in seen:
+                continue
+            seen.add(id(current))
+            stack.append((current, True))
+            if isinstance(current, gdstk.Cell):
+                stack.extend((child, False) for child in reversed(self.dependencies(current)) if id(child) not in seen)
+        self._hierarchies[id(cell)] = (cell, _reference_counts(order), tuple(order))
+        return order
+
+    def invalidate(self, cell: gdstk.Cell | None=None) -> None:
+        """Drops cached entries.
+        
+        Parameters
+        ----------
+        cell : gdstk.Cell or None, optional
+            The modified cell. As any hierarchy might contain it, all 
+            hierarchies are dropped either way. If None, the direct 
+            dependencies of all cells are dropped as well. Defaults to None.
+        """
+        self._hierarchies.clear()
+        if cell is None:
+            self._dependencies.clear()
+        else:
+            self._dependencies.pop(id(cell), None)
+
+
+def _reference_counts(cells) -> tuple[int, ...]:
+    """Number of references of each cell, used to validate cached 
+    hierarchies."""
+    return tuple(len(c.references) if isinstance(c, gdstk.Cell) else 0 for c in cells)
+
+
 def get_children(cell: gdstk.Cell) -> set[gdstk.Cell]:
     """Find all cells referenced in the cell specified, recursively.
     
+    The hierarchy is walked anew on every call. Use HierarchyIndex.ordered 
+    to get the same cells in an order suitable for gdstk.Library.add, or to 
+    reuse the walk for several cells.
+    
     Parameters
     ----------
     cell : gdstk.Cell
@@ -17,12 +124,77 @@ def get_children(cell: gdstk.Cell) -> set[gdstk.Cell]:
     set of gdstk.Cell
         All cells referenced by the cell for it's whole hierarchy.
     """
-    ref_cells = set()
-    ref_cells.add(cell)
-    for ref in cell.references:
-        ref_cells.add(ref.cell)
-        ref_cells = ref_cells.union(get_children(ref.cell))
-    return ref_cells
+    return set(HierarchyIndex().ordered(cell))
+
+
+class TemplateLibrary:
+    """Cache of parsed template files.
+    
+    Each file is read at most once per process, as long as its modification 
+    time is unchanged. Cells are indexed by name and the children of a cell 
+    are only looked up once.
+    
+    The cells returned are shared between all calls for the same file, copy 
+    them before modifying them.
+    """
+    def __init__(self) -> None:
+        # path -> (mtime, cells by name, children by name)
+        self.files = {}
+
+    def _entry(self, path) -> tuple[int, dict[str, list[gdstk.Cell]], dict[str, set[gdstk.Cell]]]:
+        path = os.path.abspath(os.fspath(path))
+        mtime = os.stat(path).st_mtime_ns
+        entry = self.files.get(path)
+        if entry is None or entry[0] != mtime:
+            by_name = {}
+            for cell in gdstk.read_gds(path).cells:
+                by_name.setdefault(cell.name, []).append(cell)
+            entry = (mtime, by_name, {})
+            self.files[path] = entry
+        return entry
+
+    def get_cell(self, cell_name: str, path) -> tuple[gdstk.Cell, set[gdstk.Cell]]:
+        """Returns a cell of a template file and its children.
+        
+        Parameters
+        ----------
+        cell_name : str
+            Name of the cell.
+        path : str or os.PathLike
+            Path of the .gds file.
+        
+        Returns
+        -------
+        gdstk.Cell
+            The cell specified.
+        set of gdstk.Cell
+            The cells referenced in the specfied cell, see get_children.
+        
+        Raises
+        ------
+        ValueError
+            If there is no or more than one cell of that name.
+        """
+        _, by_name, children = self._entry(path)
+        valid_cells = by_name.get(cell_name, [])
+        if len(valid_cells) == 0:
+            raise ValueError("No matching cell found, aborting.")
+        elif len(valid_cells) > 1:
+            raise ValueError("Multiple matching cells found, aborting.")
+        cell = valid_cells[0]
+        if cell_name not in children:
+            children[cell_name] = get_children(cell)
+        return cell, set(children[cell_name])
+
+    def invalidate(self, path=None) -> None:
+        """Forgets a parsed file, or all of them if path is None."""
+        if path is None:
+            self.files.clear()
+        else:
+            self.files.pop(os.path.abspath(os.fspath(path)), None)
+
+
+template_library = TemplateLibrary()
 
 
 def get_template_cell(
@@ -31,6 +203,9 @@ def get_template_cell(
         ) -> tuple[gdstk.Cell, list[gdstk.Cell]]:
     """Import a cell from an external library.
     
+    Files are only parsed once, see TemplateLibrary. Repeated calls return 
+    the same cells.
+    
     Parameters
     ----------
     cell_name : str
@@ -62,25 +237,22 @@ def get_template_cell(
     >>> _ = main.add(gdstk.Reference(right_marker, (44_000, 0)))
     >>> lib.save_gds("SomeOutFile.gds")
     """
-    lib = gdstk.read_gds(source_library)
-    valid_cells = [cell for cell in lib.cells if cell.name == cell_name]
-    if len(valid_cells) == 0:
-        raise ValueError("No matching cell found, aborting.")
-    elif len(valid_cells) > 1:
-        raise ValueError("Multiple matching cells found, aborting.")
-    cell = valid_cells[0]
-    children = get_children(cell)
-    return cell, children
+    return template_library.get_cell(cell_name, source_library)
 
 
 def place_cell_in_template(
         cell_to_place: gdstk.Cell, 
         origin: tuple[float, float]=(0, 0), 
         template: str="BRNC_C20mm_dice.gds", 
-        target_cell_name: str="user_design_area"
+        target_cell_name: str="user_design_area",
+        raw: bool=True,
     ) -> gdstk.Library:
     """Place a cell into the target cell of the selected template file.
     
+    By default only the target cell is parsed. All other cells of the 
+    template are carried through as gdstk.RawCell, so they are copied to the 
+    output without being decoded.
+    
     Parameters
     ----------
     cell_to_place : gdstk.Cell
@@ -91,6 +263,8 @@ def place_cell_in_template(
         Name of GDS file to insert the cell into. File must be present in the templates directory. Defaults to BRNC_C20mm_dice.gds.
     target_cell_name : str, optional
         Name of the target cell in the design in which to insert the cell.
+    raw : bool, optional
+        Whether to keep the other template cells as raw cells. If False, the whole template is parsed. Defaults to True.
     
     Returns
     -------
@@ -98,19 +272,34 @@ def place_cell_in_template(
         The template library with added cell.
     """
     with impresources.as_file(impresources.files(templates).joinpath(template)) as inp_file:
-        template_lib = gdstk.read_gds(inp_file)
+        if raw:
+            # deferred import, gdsindex depends on this module
+            from .gdsindex import GDSIndex
+            unit, precision = gdstk.gds_units(inp_file)
+            template_lib = gdstk.Library(unit=unit, precision=precision)
+            raw_cells = gdstk.read_rawcells(inp_file)
+            destination_cell, _ = GDSIndex(inp_file).read_cell(target_cell_name, dependencies=False)
+            for reference in destination_cell.references:
+                if isinstance(reference.cell, str) and reference.cell in raw_cells:
+                    reference.cell = raw_cells[reference.cell]
+            template_lib.add(destination_cell)
+            template_lib.add(*[c for name, c in raw_cells.items() if name != target_cell_name])
+        else:
+            template_lib = gdstk.read_gds(inp_file)
+            destination_cell = [c for c in template_lib.cells if isinstance(c, gdstk.Cell) and c.name == target_cell_name][0]
     
-    destination_cell = [c for c in template_lib.cells if isinstance(c, gdstk.Cell) and c.name == target_cell_name][0]
     destination_cell.add(gdstk.Reference(cell_to_place, origin))
     
     children = get_children(cell_to_place)
-    template_cell_names = [cell.name for cell in template_lib.cells]
+    template_cell_names = {cell.name for cell in template_lib.cells}
+    current_cell_names = set(template_cell_names)
     template_lib.add(cell_to_place)
+    current_cell_names.add(cell_to_place.name)
     
     for cell in children:
-        current_cell_names = [cell.name for cell in template_lib.cells]
         if cell.name not in current_cell_names:
             template_lib.add(cell)
+            current_cell_names.add(cell.name)
         if cell.name in template_cell_names :
             logging.warning(f"Cell '{cell.name}' already present in library.")    
-    return template_lib
\ No newline at end of file
+    return template_lib
@@ -1,10 +1,16 @@
 # all of below could be configured to work on lists or sets of polygons
+import concurrent.futures
 import gdstk
+import numpy as np
+
+from . import parallel
 
 
 def invert(
         polygon: gdstk.Polygon | list[gdstk.Polygon], 
-        bounding_polygon: gdstk.Polygon | list[gdstk.Polygon]
+        bounding_polygon: gdstk.Polygon | list[gdstk.Polygon],
+        tiles: int | tuple[int, int] | None=None,
+        executor: concurrent.futures.Executor | None=None,
         ) -> list[gdstk.Polygon]:
     """Inverts a polygon with respect to a bounding polygon. Both can be lists of polygons.
     
@@ -14,6 +20,14 @@ def invert(
         Polygon to invert.
     bounding_polygon : gdstk.Polygon or list of gdstk.Polygon
         Polygon to subtract initial polygon from. Defines the limits of the inversion
+    tiles : int or (int, int) or None, optional
+        If given, the inversion is processed in this many tiles, see 
+        run_tiled. The result is then returned in pieces cut at the tile 
+        seams, as an inversion is usually a single polygon spanning all tiles 
+        and merging it again would take longer than the untiled inversion. 
+        Defaults to None.
+    executor : concurrent.futures.Executor or None, optional
+        Executor to process the tiles with. Defaults to None.
     
     Returns
     -------
@@ -36,11 +50,15 @@ def invert(
        [-5., -5.],
        [ 5., -5.]])
     """
+    if tiles is not None:
+        return tiled_boolean(bounding_polygon, polygon, "not", tiles, executor, stitch=False)
     return gdstk.boolean(bounding_polygon, polygon, "not")
 
 
 def heal(
         polygon: gdstk.Polygon | list[gdstk.Polygon], 
+        tiles: int | tuple[int, int] | None=None,
+        executor: concurrent.futures.Executor | None=None,
         ) -> list[gdstk.Polygon]:
     """Merges a list of polygons.
     
@@ -48,11 +66,18 @@ def heal(
     ----------
     polygon : gdstk.Polygon or list of gdstk.Polygon
         Polygons to merge.
+    tiles : int or (int, int) or None, optional
+        If given, the merge is processed in this many tiles, see run_tiled. 
+        Defaults to None.
+    executor : concurrent.futures.Executor or None, optional
+        Executor to process the tiles with. Defaults to None.
     
     Returns
     -------
     list of gdstk.Polygon
     """
+    if tiles is not None:
+        return tiled_boolean(polygon, [], "or", tiles, executor)
     return gdstk.boolean(polygon, [], "or")
 
 
@@ -61,6 +86,8 @@ def offset_and_subtract(
         distance: float, 
         heal_before: bool=True,
         heal_after: bool=False,
+        tiles: int | tuple[int, int] | None=None,
+        executor: concurrent.futures.Executor | None=None,
         ) -> list[gdstk.Polygon]:
     """Resizes a polygon by the specified distance and subtracts the original polygon, returning a border.
     
@@ -76,11 +103,22 @@ def offset_and_subtract(
         If true performs merge on input polygons. Defaults to True.
     heal_after : bool, optional
         If true performs merge on resulting polygons. Defaults to False.
+    tiles : int or (int, int) or None, optional
+        If given, processed in this many tiles, see run_tiled. Tiles include 
+        polygons within twice the offset distance, as far as miter joins 
+        reach. Defaults to None.
+    executor : concurrent.futures.Executor or None, optional
+        Executor to process the tiles with. Defaults to None.
     
     Returns
     -------
     list of gdstk.Polygon
     """
+    if tiles is not None:
+        return run_tiled(
+            offset_and_subtract, [polygon], (distance, heal_before, heal_after), 
+            tiles=tiles, halo=2 * abs(distance), executor=executor,
+        )
     if heal_before:
         polygon = heal(polygon)
     offset = gdstk.offset(polygon, distance)
@@ -93,6 +131,113 @@ def offset_and_subtract(
     return result
 
 
+def polygon_areas(polygons: list[gdstk.Polygon]) -> np.ndarray:
+    """Areas of many polygons at once, using the shoelace formula on their 
+    concatenated points.
+    
+    Parameters
+    ----------
+    polygons : list of gdstk.Polygon
+        The polygons to measure. Repetitions are ignored.
+    
+    Returns
+    -------
+    numpy.ndarray
+        The (positive) area of each polygon.
+    """
+    if len(polygons) == 0:
+        return np.zeros(0)
+    point_list = [p.points for p in polygons]
+    lengths = np.array([len(points) for points in point_list])
+    starts = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+    points = np.concatenate(point_list)
+    # index of the next point, wrapping around within each polygon
+    following = np.arange(1, len(points) + 1)
+    following[starts + lengths - 1] = starts
+    x, y = points[:, 0], points[:, 1]
+    cross = x*y[following] - x[following]*y
+    return np.abs(np.add.reduceat(cross, starts)) / 2
+
+
+def _cyclic_neighbours(owner: np.ndarray, count: int) -> tuple[np.ndarray, np.ndarray]:
+    """Indices of the previous and next point within each polygon, for points 
+    concatenated in polygon order with owner the polygon index of each point."""
+    lengths = np.bincount(owner, minlength=count)
+    ends = np.cumsum(lengths)
+    starts = ends - lengths
+    following = np.arange(1, len(owner) + 1)
+    preceding = np.arange(-1, len(owner) - 1)
+    present = lengths > 0
+    following[ends[present] - 1] = starts[present]
+    preceding[starts[present]] = ends[present] - 1
+    return preceding, following
+
+
+def simplify(
+        polygon: gdstk.Polygon | list[gdstk.Polygon], 
+        grid: float | None=None, 
+        tolerance: float=1e-6,
+        ) -> list[gdstk.Polygon]:
+    """Snaps polygons to a grid and removes duplicate and collinear points.
+    
+    All polygons are processed together as one point array. Polygons left 
+    with less than 3 points are dropped.
+    
+    Parameters
+    ----------
+    polygon : gdstk.Polygon or list of gdstk.Polygon
+        Polygons to simplify.
+    grid : float or None, optional
+        Grid to snap the points to, e.g. the database unit. If None, points 
+        are not snapped. Defaults to None.
+    tolerance : float, optional
+        Points closer than this to the line between their neighbours are 
+        removed. Defaults to 1e-6.
+    
+    Returns
+    -------
+    list of gdstk.Polygon
+        New polygons, with layer, datatype and repetition of the originals.
+    
+    Example
+    -------
+    >>> square = gdstk.Polygon([(0, 0), (1, 0), (2, 0), (2, 2), (0, 2), (0, 2)])
+    >>> simplify(square)[0].points
+    array([[0., 0.],
+           [2., 0.],
+           [2., 2.],
+           [0., 2.]])
+    """
+    polygon = _as_list(polygon)
+    if len(polygon) == 0:
+        return []
+    point_list = [p.points for p in polygon]
+    owner = np.repeat(np.arange(len(polygon)), [len(points) for points in point_list])
+    points = np.concatenate(point_list)
+    if grid:
+        points = np.round(points / grid) * grid
+    # duplicates, comparing every point with the next one
+    _, following = _cyclic_neighbours(owner, len(polygon))
+    keep = np.any(points != points[following], axis=1)
+    points, owner = points[keep], owner[keep]
+    # collinear points, by their distance from the line through their neighbours
+    preceding, following = _cyclic_neighbours(owner, len(polygon))
+    before = points - points[preceding]
+    chord = points[following] - points[preceding]
+    cross = before[:, 0]*chord[:, 1] - before[:, 1]*chord[:, 0]
+    keep = np.abs(cross) > tolerance*np.hypot(chord[:, 0], chord[:, 1])
+    points, owner = points[keep], owner[keep]
+    lengths = np.bincount(owner, minlength=len(polygon))
+    result = []
+    for original, polygon_points in zip(polygon, np.split(points, np.cumsum(lengths)[:-1])):
+        if len(polygon_points) < 3:
+            continue
+        simplified = gdstk.Polygon(polygon_points, original.layer, original.datatype)
+        simplified.repetition = original.repetition
+        result.append(simplified)
+    return result
+
+
 def separate_resolution(
         polygon: gdstk.Polygon | list[gdstk.Polygon], 
         polarity: bool=True, 
@@ -115,7 +260,7 @@ def separate_resolution(
     overlap : float, optional
         The amount of overlap between the body and the border. Defaults to 0.03.
     min_area : float, optional
-        The area below which only the border will be returns. Only used if polarity is True. Defaults to 0.1.
+        The area below which polygons are returned whole as fine polygons, instead of being split into border and body. Only used if polarity is True. Defaults to 0.1.
     xor_before : bool, optional
         If true performs boolean xor on input polygons. Defaults to False.
     xor_after : bool, optional
@@ -126,7 +271,7 @@ def separate_resolution(
     list of gdstk.Polygon
         Polygons forming the edge.
     list of gdstk.Polygon
-        Polygons forming the body. If the polygon is smaller than min_area and polarity is True, returns an empty list.
+        Polygons forming the body. If polarity is True, polygons smaller than min_area have no body.
     """
     fine = []
     coarse = []
@@ -135,16 +280,308 @@ def separate_resolution(
     if xor_before:
         polygon = gdstk.boolean(polygon, [], "xor")
     if polarity:
-        for p in polygon:
-            if p.area() < min_area:
-                fine.append(p)
-        else:
-            fine.extend(offset_and_subtract(polygon, -fine_extent))
-            coarse.extend(gdstk.offset(polygon, -fine_extent+overlap))
+        small = polygon_areas(polygon) < min_area
+        fine.extend(p for p, is_small in zip(polygon, small) if is_small)
+        large = [p for p, is_small in zip(polygon, small) if not is_small]
+        if large:
+            fine.extend(offset_and_subtract(large, -fine_extent))
+            coarse.extend(gdstk.offset(large, -fine_extent+overlap))
     else:
         fine.extend(offset_and_subtract(polygon, fine_extent))
         coarse.extend(gdstk.offset(polygon, fine_extent-overlap))
     if xor_after:
         fine = gdstk.boolean(fine, [], "xor")
         coarse = gdstk.boolean(coarse, [], "xor")
-    return fine, coarse
\ No newline at end of file
+    return fine, coarse
+
+
+def _as_list(polygon: gdstk.Polygon | list[gdstk.Polygon]) -> list[gdstk.Polygon]:
+    if isinstance(polygon, gdstk.Polygon):
+        return [polygon]
+    return list(polygon)
+
+
+def _bounding_boxes(polygons: list[gdstk.Polygon]) -> np.ndarray:
+    """Bounding boxes of polygons as (N, 2, 2) array of ((xmin, ymin), (xmax, ymax))."""
+    if len(polygons) == 0:
+        return np.zeros((0, 2, 2))
+    return np.array([polygon.bounding_box() for polygon in polygons], dtype=float)
+
+
+# extra margin when selecting polygons, as results are snapped to the 
+# boolean grid
+_TILE_TOLERANCE = 1e-3
+
+
+def _touching(boxes: np.ndarray, box, margin: float) -> np.ndarray:
+    """Mask of the bounding boxes touching box grown by margin."""
+    (x0, y0), (x1, y1) = box
+    return (
+        (boxes[:, 0, 0] <= x1 + margin) & (boxes[:, 1, 0] >= x0 - margin)
+        & (boxes[:, 0, 1] <= y1 + margin) & (boxes[:, 1, 1] >= y0 - margin)
+    )
+
+
+def _owner(boxes: np.ndarray, x_edges: np.ndarray, y_edges: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Tile containing the centre of each bounding box and whether the box 
+    lies within that tile. The outer sides of the grid are open.
+    
+    A result polygon within its tile only depends on the polygons selected 
+    for that tile, so the tile computes it completely."""
+    centre = boxes.mean(axis=1)
+    nx, ny = len(x_edges) - 1, len(y_edges) - 1
+    i = np.clip(np.searchsorted(x_edges, centre[:, 0], "right") - 1, 0, nx - 1)
+    j = np.clip(np.searchsorted(y_edges, centre[:, 1], "right") - 1, 0, ny - 1)
+    inside = (
+        ((i == 0) | (boxes[:, 0, 0] >= x_edges[i])) & ((i == nx - 1) | (boxes[:, 1, 0] <= x_edges[i + 1]))
+        & ((j == 0) | (boxes[:, 0, 1] >= y_edges[j])) & ((j == ny - 1) | (boxes[:, 1, 1] <= y_edges[j + 1]))
+    )
+    return i, j, inside
+
+
+def _tile_worker(function, operands: list, args: tuple, tile: tuple, grid: tuple) -> tuple[list, np.ndarray]:
+    """Runs function on the polygons selected for one tile. Operands and 
+    result are packed, so this can run in a worker process.
+    
+    Returns the result polygons owned and completely computed by this tile, 
+    and the bounding boxes of all polygons not completely computed by their 
+    tile, which are recomputed afterwards."""
+    result = function(*parallel.unpack(operands), *args)
+    if len(result) == 0:
+        return [], np.zeros((0, 2, 2))
+    box = _bounding_boxes(result)
+    i, j, inside = _owner(box, *grid)
+    owned = inside & (i == tile[0]) & (j == tile[1])
+    return parallel.pack([polygon for polygon, keep in zip(result, owned) if keep]), box[~inside]
+
+
+def _clipped_tile_worker(function, operands: list, args: tuple, tile: tuple, halo: float) -> list:
+    """Runs function on the polygons selected for one tile and clips the 
+    result to the tile, see _tile_worker.
+    
+    Without halo (booleans), the operands are clipped instead of the result, 
+    as booleans on results with many holes are slow."""
+    operands = parallel.unpack(operands)
+    if halo == 0:
+        rectangle = _tile_rectangle(tile, _bounding_boxes([polygon for operand in operands for polygon in operand]))
+        return parallel.pack(function(*(gdstk.boolean(operand, rectangle, "and") for operand in operands), *args))
+    result = function(*operands, *args)
+    if len(result) == 0:
+        return []
+    return parallel.pack(gdstk.boolean(result, _tile_rectangle(tile, _bounding_boxes(result)), "and"))
+
+
+def _tile_rectangle(tile: tuple, box: np.ndarray) -> gdstk.Polygon:
+    """Rectangle of a tile. Open sides at the edge of the grid are not 
+    clipped, they extend to the bounding boxes given (e.g. of a result 
+    growing past the input when offsetting)."""
+    (x0, y0), (x1, y1) = tile
+    corner1 = (box[:, 0, 0].min() if x0 is None else x0, box[:, 0, 1].min() if y0 is None else y0)
+    corner2 = (box[:, 1, 0].max() if x1 is None else x1, box[:, 1, 1].max() if y1 is None else y1)
+    return gdstk.rectangle(corner1, corner2)
+
+
+def run_tiled(
+        function,
+        operands: list[gdstk.Polygon | list[gdstk.Polygon]],
+        args: tuple=(),
+        tiles: int | tuple[int, int]=2,
+        halo: float=0,
+        executor: concurrent.futures.Executor | None=None,
+        stitch: bool=True,
+        ) -> list[gdstk.Polygon]:
+    """Runs a polygon operation tile by tile on a bounding-box grid.
+    
+    The area covered by all operands is divided into a grid of tiles. For each 
+    tile, every operand is reduced to the polygons whose bounding box touches 
+    the tile (grown by halo) and function is called on them. This bounds the 
+    size of each boolean and lets tiles run in parallel.
+    
+    Each result polygon is taken from the tile containing the centre of its 
+    bounding box, if it lies within that tile. Result polygons crossing a seam 
+    are instead computed again from all polygons they depend on, so nothing is 
+    cut and merged again. Without stitching, the results are clipped to their 
+    tiles and polygons crossing a seam are returned in pieces.
+    
+    The result is only exact for operations whose output depends on the input 
+    within halo of it, e.g. booleans (halo 0) or offsets (halo at least as 
+    far as the offset moves vertices).
+    
+    Tiling pays off for layers too large for a single boolean, or when the 
+    tiles run in parallel, as long as most result polygons are small compared 
+    to the tiles. A polygon spanning many tiles (e.g. an inversion) is 
+    computed from all polygons it depends on in a single boolean after the 
+    tiles, so stitch should be False then.
+    
+    Parameters
+    ----------
+    function : callable
+        Called as function(*operands, *args) and returning a list of polygons. 
+        Must be picklable (a module level function) when using a process pool.
+    operands : list
+        The polygon arguments of function, each a polygon or list of polygons.
+    args : tuple, optional
+        Further arguments passed to function. Defaults to ().
+    tiles : int or (int, int), optional
+        Number of tiles along x and y. Defaults to 2.
+    halo : float, optional
+        Distance around a tile within which polygons are included. Defaults 
+        to 0.
+    executor : concurrent.futures.Executor or None, optional
+        Executor to process the tiles with, e.g. a ProcessPoolExecutor. If 
+        None, the tiles are processed serially. Defaults to None.
+    stitch : bool, optional
+        If True, polygons crossing the seams between tiles are returned whole. 
+        Otherwise they are returned in pieces clipped to the tiles. Defaults 
+        to True.
+    
+    Returns
+    -------
+    list of gdstk.Polygon
+    
+    Example
+    -------
+    >>> merged = run_tiled(heal, [polygons], tiles=(4, 4))
+    """
+    operands = [_as_list(operand) for operand in operands]
+    boxes = [_bounding_boxes(operand) for operand in operands]
+    all_boxes = np.concatenate(boxes)
+    if len(all_boxes) == 0:
+        return function(*operands, *args)
+    nx, ny = (tiles, tiles) if isinstance(tiles, int) else tiles
+    x_edges = np.linspace(all_boxes[:, 0, 0].min(), all_boxes[:, 1, 0].max(), nx + 1)
+    y_edges = np.linspace(all_boxes[:, 0, 1].min(), all_boxes[:, 1, 1].max(), ny + 1)
+    jobs = []
+    for i in range(nx):
+        for j in range(ny):
+            tile = ((x_edges[i], y_edges[j]), (x_edges[i + 1], y_edges[j + 1]))
+            selected = [
+                [operand[k] for k in np.flatnonzero(_touching(box, tile, halo + _TILE_TOLERANCE))]
+                for operand, box in zip(operands, boxes)
+            ]
+            if not any(selected):
+                continue
+            if stitch:
+                jobs.append((_tile_worker, selected, (i, j), (x_edges, y_edges)))
+            else:
+                clip = (
+                    (x_edges[i] if i > 0 else None, y_edges[j] if j > 0 else None), 
+                    (x_edges[i + 1] if i < nx - 1 else None, y_edges[j + 1] if j < ny - 1 else None),
+                )
+                jobs.append((_clipped_tile_worker, selected, clip, halo))
+    if executor is None:
+        pieces = [worker(function, selected, args, *job) for worker, selected, *job in jobs]
+    else:
+        futures = [
+            executor.submit(worker, function, parallel.pack(selected), args, *job)
+            for worker, selected, *job in jobs
+        ]
+        pieces = [future.result() for future in futures]
+    if not stitch:
+        return [polygon for piece in pieces for polygon in parallel.unpack(piece)]
+    result = [polygon for piece, _ in pieces for polygon in parallel.unpack(piece)]
+    incomplete = [box for _, piece_boxes in pieces for box in piece_boxes]
+    if not incomplete:
+        return result
+    completed, drop = _complete_seams(function, operands, boxes, args, halo, incomplete, result, (x_edges, y_edges))
+    return [polygon for polygon, dropped in zip(result, drop) if not dropped] + completed
+
+
+def _complete_seams(
+        function,
+        operands: list[list[gdstk.Polygon]],
+        boxes: list[np.ndarray],
+        args: tuple,
+        halo: float,
+        incomplete: list[np.ndarray],
+        owned: list[gdstk.Polygon],
+        grid: tuple,
+        ) -> tuple[list[gdstk.Polygon], np.ndarray]:
+    """Computes the result around the polygons not within a single tile, see 
+    run_tiled.
+    
+    Starting from the polygons touching the bounding boxes of the incomplete 
+    results of the tiles, function is called on a growing selection. The 
+    region taken from it is everything connected (by overlapping bounding 
+    boxes) to these boxes or to a result polygon crossing a seam, including 
+    polygons already owned by the tiles. It grows until every polygon in it 
+    depends only on selected polygons. As the result in that region 
+    may be split differently than by the tiles, all of it is taken from here 
+    and the owned polygons in it are dropped.
+    
+    Returns
+    -------
+    list of gdstk.Polygon
+        The result polygons of the region.
+    numpy.ndarray
+        Mask of the owned polygons to drop.
+    """
+    margin = halo + _TILE_TOLERANCE
+    selected = [np.zeros(len(box), dtype=bool) for box in boxes]
+    for box in incomplete:
+        for mask, operand_boxes in zip(selected, boxes):
+            mask |= _touching(operand_boxes, box, margin)
+    owned_boxes = _bounding_boxes(owned)
+    while True:
+        result = function(*([operand[k] for k in np.flatnonzero(mask)] for operand, mask in zip(operands, selected)), *args)
+        result_boxes = _bounding_boxes(result)
+        start = ~_owner(result_boxes, *grid)[2]
+        for box in incomplete:
+            start |= _touching(result_boxes, box, _TILE_TOLERANCE)
+        region_boxes = np.concatenate([result_boxes, owned_boxes])
+        region = _connected(region_boxes, np.concatenate([start, np.zeros(len(owned), dtype=bool)]))
+        grown = False
+        for box in region_boxes[region]:
+            for mask, operand_boxes in zip(selected, boxes):
+                missing = _touching(operand_boxes, box, margin) & ~mask
+                if missing.any():
+                    mask |= missing
+                    grown = True
+        if not grown:
+            return [polygon for polygon, keep in zip(result, region) if keep], region[len(result):]
+
+
+def _connected(boxes: np.ndarray, start: np.ndarray) -> np.ndarray:
+    """Mask of the bounding boxes connected to those in start by a chain of 
+    touching boxes."""
+    reached = start.copy()
+    frontier = np.flatnonzero(start)
+    while len(frontier) > 0:
+        new = np.zeros(len(boxes), dtype=bool)
+        for i in frontier:
+            new |= _touching(boxes, boxes[i], _TILE_TOLERANCE)
+        new &= ~reached
+        reached |= new
+        frontier = np.flatnonzero(new)
+    return reached
+
+
+def tiled_boolean(
+        operand1: gdstk.Polygon | list[gdstk.Polygon], 
+        operand2: gdstk.Polygon | list[gdstk.Polygon], 
+        operation: str, 
+        tiles: int | tuple[int, int]=2,
+        executor: concurrent.futures.Executor | None=None,
+        stitch: bool=True,
+        ) -> list[gdstk.Polygon]:
+    """Same as gdstk.boolean, but processed in tiles with run_tiled.
+    
+    Parameters
+    ----------
+    operand1, operand2 : gdstk.Polygon or list of gdstk.Polygon
+        The operands of the boolean.
+    operation : str
+        One of "or", "and", "xor" or "not".
+    tiles : int or (int, int), optional
+        Number of tiles along x and y. Defaults to 2.
+    executor : concurrent.futures.Executor or None, optional
+        Executor to process the tiles with. Defaults to None.
+    stitch : bool, optional
+        If True, polygons cut at the seams between tiles are merged again. 
+        Defaults to True.
+    
+    Returns
+    -------
+    list of gdstk.Polygon
+    """
+    return run_tiled(gdstk.boolean, [operand1, operand2], (operation,), tiles=tiles, executor=executor, stitch=stitch)
@@ -0,0 +1,280 @@
+# helpers to generate devices in worker processes
+# gdstk objects can not be pickled, so geometry is shipped as plain arrays
+import concurrent.futures
+import gdstk
+import numpy as np
+
+from .cache import build_cache
+
+
+class PackedPolygon:
+    """Picklable stand-in for a gdstk.Polygon."""
+    __slots__ = ("points", "layer", "datatype")
+
+    def __init__(self, polygon: gdstk.Polygon) -> None:
+        self.points = polygon.points
+        self.layer = polygon.layer
+        self.datatype = polygon.datatype
+
+    def __getstate__(self):
+        return (self.points, self.layer, self.datatype)
+
+    def __setstate__(self, state):
+        self.points, self.layer, self.datatype = state
+
+    def unpack(self) -> gdstk.Polygon:
+        return gdstk.Polygon(self.points, self.layer, self.datatype)
+
+
+def pack(obj):
+    """Recursively replaces polygons inside lists, tuples and dicts with
+    picklable PackedPolygons.
+
+    Parameters
+    ----------
+    obj : object
+        Object to pack, e.g. the components dict of a build.
+
+    Returns
+    -------
+    object
+        A copy of obj that can be pickled, provided its other contents can.
+    """
+    if isinstance(obj, gdstk.Polygon):
+        return PackedPolygon(obj)
+    if isinstance(obj, (list, tuple)):
+        return type(obj)(pack(item) for item in obj)
+    if isinstance(obj, dict):
+        # keeps dict subclasses such as LayerMap
+        return type(obj)({k: pack(v) for k, v in obj.items()})
+    return obj
+
+
+def unpack(obj):
+    """Inverse of pack."""
+    if isinstance(obj, PackedPolygon):
+        return obj.unpack()
+    if isinstance(obj, (list, tuple)):
+        return type(obj)(unpack(item) for item in obj)
+    if isinstance(obj, dict):
+        return type(obj)({k: unpack(v) for k, v in obj.items()})
+    return obj
+
+
+def _pack_repetition(repetition: gdstk.Repetition | None) -> dict | None:
+    if repetition is None or repetition.size == 0:
+        return None
+    if repetition.columns is not None:
+        if repetition.spacing is not None:
+            return {"columns": repetition.columns, "rows": repetition.rows, "spacing": repetition.spacing}
+        return {"columns": repetition.columns, "rows": repetition.rows, "v1": repetition.v1, "v2": repetition.v2}
+    if repetition.offsets is not None:
+        return {"offsets": repetition.offsets}
+    if repetition.x_offsets is not None:
+        return {"x_offsets": repetition.x_offsets}
+    return {"y_offsets": repetition.y_offsets}
+
+
+def pack_cell(cell: gdstk.Cell) -> dict:
+    """Converts a cell into a compact, picklable form.
+
+    Polygons are stored per (layer, datatype) as one concatenated point array
+    with the start index of each polygon. Paths are converted to polygons and
+    polygon repetitions are expanded. References are stored by cell name.
+
+    Parameters
+    ----------
+    cell : gdstk.Cell
+        The cell to pack. Referenced cells are not packed.
+
+    Returns
+    -------
+    dict
+    """
+    polygons = list(cell.polygons)
+    for path in cell.paths:
+        polygons.extend(path.to_polygons())
+    grouped = {}
+    for polygon in polygons:
+        if polygon.repetition.size > 0:
+            grouped.setdefault((polygon.layer, polygon.datatype), []).extend(
+                p.points for p in polygon.copy().apply_repetition()
+            )
+        else:
+            grouped.setdefault((polygon.layer, polygon.datatype), []).append(polygon.points)
+    layers = {}
+    for spec, point_list in grouped.items():
+        lengths = [len(points) for points in point_list]
+        layers[spec] = (np.concatenate(point_list), np.cumsum([0] + lengths[:-1]))
+    references = [
+        (
+            ref.cell if isinstance(ref.cell, str) else ref.cell.name,
+            ref.origin, ref.rotation, ref.magnification, ref.x_reflection,
+            _pack_repetition(ref.repetition),
+        )
+        for ref in cell.references
+    ]
+    labels = [
+        (label.text, label.origin, label.anchor, label.rotation, label.magnification,
+         label.x_reflection, label.layer, label.texttype)
+        for label in cell.labels
+    ]
+    return {"name": cell.name, "layers": layers, "references": references, "labels": labels}
+
+
+def unpack_cell(packed: dict, cells: dict[str, gdstk.Cell]={}) -> gdstk.Cell:
+    """Rebuilds a cell packed with pack_cell.
+
+    Parameters
+    ----------
+    packed : dict
+        Result of pack_cell.
+    cells : dict of str to gdstk.Cell, optional
+        Cells to resolve references with, by name. Unresolved references are
+        kept by name. Defaults to an empty dict.
+
+    Returns
+    -------
+    gdstk.Cell
+    """
+    cell = gdstk.Cell(packed["name"])
+    for (layer, datatype), (points, starts) in packed["layers"].items():
+        cell.add(*[
+            gdstk.Polygon(polygon_points, layer, datatype)
+            for polygon_points in np.split(points, starts[1:])
+        ])
+    for name, origin, rotation, magnification, x_reflection, repetition in packed["references"]:
+        ref = gdstk.Reference(cells.get(name, name), origin, rotation, magnification, x_reflection)
+        if repetition is not None:
+            ref.repetition = gdstk.Repetition(**repetition)
+        cell.add(ref)
+    for text, origin, anchor, rotation, magnification, x_reflection, layer, texttype in packed["labels"]:
+        cell.add(gdstk.Label(text, origin, anchor, rotation, magnification, x_reflection, layer, texttype))
+    return cell
+
+
+def pack_hierarchy(cell: gdstk.Cell, exclude: set[str]=set()) -> list[dict]:
+    """Packs a cell and all cells below it with pack_cell.
+    
+    Parameters
+    ----------
+    cell : gdstk.Cell
+        The top cell.
+    exclude : set of str, optional
+        Names of cells not to pack, e.g. the main cell of a feature. 
+        References to them are kept by name. Defaults to an empty set.
+    
+    Returns
+    -------
+    list of dict
+        The packed cells, children before their parents, the top cell last.
+    """
+    packed = []
+    seen = set(exclude)
+    stack = [(cell, False)]
+    # depth first, so children are packed before their parents
+    while stack:
+        current, expanded = stack.pop()
+        if expanded:
+            packed.append(pack_cell(current))
+            continue
+        if current.name in seen:
+            continue
+        seen.add(current.name)
+        stack.append((current, True))
+        for ref in current.references:
+            if isinstance(ref.cell, gdstk.Cell) and ref.cell.name not in seen:
+                stack.append((ref.cell, False))
+    return packed
+
+
+def unpack_hierarchy(packed_cells: list[dict], cells: dict[str, gdstk.Cell]) -> gdstk.Cell:
+    """Inverse of pack_hierarchy.
+    
+    Parameters
+    ----------
+    packed_cells : list of dict
+        Result of pack_hierarchy.
+    cells : dict of str to gdstk.Cell
+        Cells to resolve references with, by name. Sub-cells not yet present 
+        are unpacked and added, so they are shared between calls. The top 
+        cell is always unpacked anew.
+    
+    Returns
+    -------
+    gdstk.Cell
+        The top cell.
+    """
+    for packed in packed_cells[:-1]:
+        if packed["name"] not in cells:
+            cells[packed["name"]] = unpack_cell(packed, cells)
+    return unpack_cell(packed_cells[-1], cells)
+
+
+def _build_packed(feature, parameter_set: tuple) -> tuple[list[dict], object]:
+    """Worker side of build_all: builds the device and packs all cells below
+    it, except the main cell of the feature."""
+    device, components = feature.build(*parameter_set)
+    return pack_hierarchy(device, {feature.main_cell.name}), pack(components)
+
+
+def build_all(
+        feature,
+        parameter_sets: list[tuple],
+        executor: concurrent.futures.Executor | None=None,
+        ) -> list[tuple[gdstk.Cell, dict]]:
+    """Builds a device for every parameter set, in parallel if an executor
+    is given.
+
+    If the build cache is enabled, each unique parameter set is only built
+    once, results already in the cache are reused and new results are added
+    to it. Otherwise every parameter set is built. Workers return
+    the cells packed as point arrays, the calling process only reassembles
+    them.
+
+    Parameters
+    ----------
+    feature : Feature
+        The feature used to build the devices. Must be picklable when using
+        a process pool, which all Feature subclasses are.
+    parameter_sets : list of tuple
+        The arguments for each build call.
+    executor : concurrent.futures.Executor or None, optional
+        Executor to run the builds with, e.g. a ProcessPoolExecutor. If None,
+        the builds run serially in this process. Defaults to None.
+
+    Returns
+    -------
+    list of (gdstk.Cell, dict)
+        The device cell and components for each parameter set, in order.
+    """
+    parameter_sets = [tuple(parameter_set) for parameter_set in parameter_sets]
+    if executor is None:
+        return [build_cache.build(feature, *parameter_set) for parameter_set in parameter_sets]
+    keys = []
+    for i, parameter_set in enumerate(parameter_sets):
+        key = build_cache.key(feature, *parameter_set) if build_cache.enabled else None
+        # without cache, or if they can not be keyed, parameter sets are built individually
+        keys.append(key if key is not None else ("uncached", i))
+    results = {}
+    futures = {}
+    for key, parameter_set in zip(keys, parameter_sets):
+        if key in results or key in futures:
+            continue
+        cached = build_cache.get(key) if key[0] != "uncached" else None
+        if cached is not None:
+            results[key] = cached
+        else:
+            futures[key] = executor.submit(_build_packed, feature, parameter_set)
+    cells = {feature.main_cell.name: feature.main_cell}
+    for key, future in futures.items():
+        packed_cells, components = future.result()
+        # sub-cells shared between devices are only rebuilt once
+        results[key] = (unpack_hierarchy(packed_cells, cells), unpack(components))
+        if key[0] != "uncached":
+            build_cache.put(key, results[key])
+    built = []
+    for key in keys:
+        device, components = results[key]
+        built.append((device, components.copy()))
+    return built
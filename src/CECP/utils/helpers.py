@@ -1,3 +1,6 @@
+import gdstk
+import numpy as np
+
 
 def flatten(nested_list: list) -> list:
     """Flattens a list, unpacking all nested lists.
@@ -17,4 +20,84 @@ def flatten(nested_list: list) -> list:
         else:
             flattened_list.append(item)
     return flattened_list
-            
\ No newline at end of file
+            
+
+def mask_rectangles(mask: np.ndarray) -> list[tuple[int, int, int, int]]:
+    """Decomposes a 2D boolean mask into rectangular blocks of True entries.
+    
+    Runs of True along the second axis are merged with identical runs in the 
+    following rows, so a full mask gives a single block and holes split it 
+    into a few blocks around them.
+    
+    Parameters
+    ----------
+    mask : numpy.ndarray
+        2D boolean array.
+    
+    Returns
+    -------
+    list of (int, int, int, int)
+        (row, column, number of rows, number of columns) of each block.
+    """
+    mask = np.asarray(mask, dtype=bool)
+    blocks = []
+    open_blocks = {}
+    for row in range(mask.shape[0]):
+        padded = np.concatenate([[False], mask[row], [False]])
+        edges = np.flatnonzero(padded[1:] != padded[:-1])
+        runs = set(zip(edges[::2], edges[1::2]))
+        for span in list(open_blocks):
+            if span not in runs:
+                start = open_blocks.pop(span)
+                blocks.append((start, span[0], row - start, span[1] - span[0]))
+        for span in runs:
+            open_blocks.setdefault(span, row)
+    for span, start in open_blocks.items():
+        blocks.append((start, span[0], mask.shape[0] - start, span[1] - span[0]))
+    return [tuple(int(v) for v in block) for block in sorted(blocks)]
+
+
+def box_polygons(boxes: np.ndarray, layer: int=0, datatype: int=0) -> list[gdstk.Polygon]:
+    """Converts bounding boxes into rectangles.
+    
+    Parameters
+    ----------
+    boxes : numpy.ndarray
+        (N, 2, 2) array of ((xmin, ymin), (xmax, ymax)).
+    layer : int, optional
+        Layer of the rectangles. Defaults to 0.
+    datatype : int, optional
+        Datatype of the rectangles. Defaults to 0.
+    
+    Returns
+    -------
+    list of gdstk.Polygon
+    """
+    return [gdstk.rectangle(lower, upper, layer, datatype) for lower, upper in np.asarray(boxes, dtype=float).reshape(-1, 2, 2)]
+
+
+def rectangle_corners(polygon: gdstk.Polygon) -> tuple[tuple[float, float], tuple[float, float]] | None:
+    """Returns the corners of a polygon if it is an axis-aligned rectangle.
+    
+    Polygons with a repetition are not treated as rectangles.
+    
+    Parameters
+    ----------
+    polygon : gdstk.Polygon
+        The polygon to check.
+    
+    Returns
+    -------
+    ((float, float), (float, float)) or None
+        Lower left and upper right corner, None if polygon is not a rectangle.
+    """
+    points = polygon.points
+    if len(points) != 4 or polygon.repetition.size > 0:
+        return None
+    edges = np.roll(points, -1, axis=0) - points
+    horizontal = edges[:, 1] == 0
+    vertical = edges[:, 0] == 0
+    if np.any(horizontal == vertical) or horizontal[0] != horizontal[2] or horizontal[0] == horizontal[1]:
+        return None
+    (x0, y0), (x1, y1) = points.min(axis=0), points.max(axis=0)
+    return ((x0, y0), (x1, y1))
@@ -0,0 +1,70 @@
+import concurrent.futures
+import sys
+from pathlib import Path
+
+import gdstk
+import numpy as np
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+from CECP import operations
+
+
+def _area(polygons):
+    return sum(polygon.area() for polygon in polygons)
+
+
+def _polygons(seed=2, count=600, size=2000):
+    rng = np.random.default_rng(seed)
+    polygons = [
+        gdstk.regular_polygon(rng.uniform(0, size, 2), rng.uniform(3, 30), int(rng.integers(3, 9)))
+        for _ in range(count)
+    ]
+    # Long bars crossing several seams
+    polygons += [gdstk.rectangle((0, y), (size, y + 8)) for y in (400, 1100)]
+    polygons += [gdstk.rectangle((x, 0), (x + 8, size)) for x in (700, 1500)]
+    return polygons
+
+
+def _assert_same(untiled, tiled):
+    assert _area(tiled) == pytest.approx(_area(untiled), rel=1e-6)
+    assert _area(gdstk.boolean(untiled, tiled, "xor")) < 1e-6 * _area(untiled)
+
+
+@pytest.fixture(scope="module")
+def executor():
+    with concurrent.futures.ProcessPoolExecutor(2) as executor:
+        yield executor
+
+
+@pytest.mark.parametrize("tiles", [2, (3, 4), 7])
+@pytest.mark.parametrize("parallel", [False, True])
+def test_tiled_heal(tiles, parallel, request):
+    executor = request.getfixturevalue("executor") if parallel else None
+    polygons = _polygons()
+    _assert_same(operations.heal(polygons), operations.heal(polygons, tiles=tiles, executor=executor))
+
+
+@pytest.mark.parametrize("tiles", [2, (3, 4), 7])
+@pytest.mark.parametrize("parallel", [False, True])
+def test_tiled_invert(tiles, parallel, request):
+    executor = request.getfixturevalue("executor") if parallel else None
+    polygons = _polygons()
+    bounds = gdstk.rectangle((-50, -50), (2050, 2050))
+    _assert_same(
+        operations.invert(polygons, bounds),
+        operations.invert(polygons, bounds, tiles=tiles, executor=executor),
+    )
+
+
+@pytest.mark.parametrize("distance", [2.0, -2.0, 5.0])
+@pytest.mark.parametrize("tiles", [2, (3, 4), 7])
+@pytest.mark.parametrize("parallel", [False, True])
+def test_tiled_offset_and_subtract(distance, tiles, parallel, request):
+    executor = request.getfixturevalue("executor") if parallel else None
+    polygons = _polygons()
+    _assert_same(
+        operations.offset_and_subtract(polygons, distance),
+        operations.offset_and_subtract(polygons, distance, tiles=tiles, executor=executor),
+    )